@@ -1,20 +1,157 @@
+import atexit
+import csv
+import json
 import os
-import random
+import socket
+import threading
 import time
-from datetime import datetime
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
 from io import StringIO
 
-from flask import Flask, render_template_string, request, redirect, url_for, flash, session
+from flask import (Flask, Response, abort, jsonify, request, redirect, stream_with_context,
+                   url_for, flash, session)
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 import requests
 from apscheduler.schedulers.background import BackgroundScheduler
 
+import migrations
+from conditional import ResponseStore
+from dns_cache import DnsCache
+from http_pool import AsyncConnectionPool, SessionPool
+from live_feed import ChangeFeed
+import metrics
+from notifications import Notifier, Transition, WebhookChannel
+import monitor_io
+from probe_engine import CheckResult, ProbeEngine
+from timing_wheel import HeartbeatScheduler
+from sharding import ShardMembership
+from probe_policy import ProbePolicy
+import probes
+import storage
+from status_cache import AVAILABLE, MonitorStatus, StatusCache
+from template_registry import TemplateRegistry
+from timeseries import as_binary, as_json, lttb
+from rollup import Aggregate, RollupAccumulator, pick_resolution, MINUTE, HOUR, DAY, RESOLUTIONS
+from uptime import UptimeTracker, WINDOW_24H, WINDOW_30D
+from write_behind import WriteBehindQueue
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///uptime.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
+# DATABASE_URL may point at SQLite or PostgreSQL; others are refused at
+# startup. Reads use a separate pool of DATABASE_READ_POOL_SIZE read-only
+# connections (0 shares the writer's) to DATABASE_READ_URL, by default the
+# same database, e.g. a replica. A SQLite file is written through one
+# connection per process and opened with the SQLITE_* pragmas; in WAL mode
+# pages keep loading while the checker writes.
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///uptime.db')
+app.config['DATABASE_READ_URL'] = os.environ.get('DATABASE_READ_URL',
+                                                 app.config['SQLALCHEMY_DATABASE_URI'])
+app.config['DATABASE_READ_POOL_SIZE'] = int(os.environ.get('DATABASE_READ_POOL_SIZE', 5))
+app.config['SQLITE_JOURNAL_MODE'] = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 2**20))
+# Pages, or KiB when negative.
+app.config['SQLITE_CACHE_SIZE'] = int(os.environ.get('SQLITE_CACHE_SIZE', -64 * 1024))
+app.config['SQLITE_BUSY_TIMEOUT'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))
+app.config['SQLALCHEMY_ENGINE_OPTIONS'], app.config['SQLALCHEMY_BINDS'] = storage.engine_options(
+    app.config['SQLALCHEMY_DATABASE_URI'], app.config['DATABASE_READ_URL'],
+    app.config['DATABASE_READ_POOL_SIZE'])
+# 'asyncio' runs checks on the shared probe engine, 'thread' runs each check
+# as a blocking job on the scheduler's thread pool.
+app.config['CHECK_ENGINE'] = os.environ.get('CHECK_ENGINE', 'asyncio')
+app.config['PROBE_CONCURRENCY'] = int(os.environ.get('PROBE_CONCURRENCY', 500))
+app.config['PROBE_PER_HOST_LIMIT'] = int(os.environ.get('PROBE_PER_HOST_LIMIT', 10))
+app.config['CHECK_THREADS'] = int(os.environ.get('CHECK_THREADS', 10))
+# Probe timeouts (seconds). The read timeout adapts to each monitor's recent
+# p99 latency times PROBE_TIMEOUT_MULTIPLIER, within the min/max bounds.
+app.config['PROBE_CONNECT_TIMEOUT'] = float(os.environ.get('PROBE_CONNECT_TIMEOUT', 5))
+app.config['PROBE_MIN_READ_TIMEOUT'] = float(os.environ.get('PROBE_MIN_READ_TIMEOUT', 2))
+app.config['PROBE_MAX_READ_TIMEOUT'] = float(os.environ.get('PROBE_MAX_READ_TIMEOUT', 30))
+app.config['PROBE_TIMEOUT_MULTIPLIER'] = float(os.environ.get('PROBE_TIMEOUT_MULTIPLIER', 3))
+# HTTP checks read at most this much of a response body.
+app.config['PROBE_MAX_BODY_BYTES'] = int(os.environ.get('PROBE_MAX_BODY_BYTES', 65536))
+# HTTP checks follow up to this many redirects; 0 judges the redirect itself.
+app.config['PROBE_MAX_REDIRECTS'] = int(os.environ.get('PROBE_MAX_REDIRECTS', 10))
+# Revalidate HTTP GET checks with If-None-Match / If-Modified-Since and
+# treat 304 Not Modified as up.
+app.config['PROBE_CONDITIONAL'] = os.environ.get('PROBE_CONDITIONAL', '1') == '1'
+# Host lookups for checks are cached for DNS_CACHE_TTL seconds (failures for
+# DNS_NEGATIVE_TTL) and refreshed in the background once DNS_PREFETCH of the
+# TTL has passed.
+app.config['DNS_CACHE_TTL'] = float(os.environ.get('DNS_CACHE_TTL', 60))
+app.config['DNS_NEGATIVE_TTL'] = float(os.environ.get('DNS_NEGATIVE_TTL', 10))
+app.config['DNS_CACHE_SIZE'] = int(os.environ.get('DNS_CACHE_SIZE', 4096))
+app.config['DNS_PREFETCH'] = float(os.environ.get('DNS_PREFETCH', 0.8))
+app.config['WHEEL_TICK_MS'] = int(os.environ.get('WHEEL_TICK_MS', 100))
+app.config['WHEEL_SLOTS'] = int(os.environ.get('WHEEL_SLOTS', 512))
+app.config['HTTP_POOL_SIZE'] = int(os.environ.get('HTTP_POOL_SIZE', 10))
+app.config['HTTP_KEEP_ALIVE'] = os.environ.get('HTTP_KEEP_ALIVE', '1') == '1'
+app.config['HTTP_POOL_IDLE_TIMEOUT'] = int(os.environ.get('HTTP_POOL_IDLE_TIMEOUT', 90))
+app.config['WRITE_BEHIND_MAX_ROWS'] = int(os.environ.get('WRITE_BEHIND_MAX_ROWS', 500))
+app.config['WRITE_BEHIND_FLUSH_MS'] = int(os.environ.get('WRITE_BEHIND_FLUSH_MS', 1000))
+# Raw history is kept for RETENTION_RAW_DAYS; after that only rollups remain.
+# A retention setting of 0 keeps that data forever.
+app.config['RETENTION_RAW_DAYS'] = int(os.environ.get('RETENTION_RAW_DAYS', 14))
+app.config['RETENTION_MINUTE_ROLLUP_DAYS'] = int(os.environ.get('RETENTION_MINUTE_ROLLUP_DAYS', 2))
+app.config['RETENTION_HOUR_ROLLUP_DAYS'] = int(os.environ.get('RETENTION_HOUR_ROLLUP_DAYS', 90))
+app.config['RETENTION_DAY_ROLLUP_DAYS'] = int(os.environ.get('RETENTION_DAY_ROLLUP_DAYS', 0))
+app.config['RETENTION_INTERVAL'] = int(os.environ.get('RETENTION_INTERVAL', 300))
+app.config['RETENTION_BATCH_SIZE'] = int(os.environ.get('RETENTION_BATCH_SIZE', 1000))
+app.config['RETENTION_MAX_BATCHES'] = int(os.environ.get('RETENTION_MAX_BATCHES', 200))
+app.config['RETENTION_VACUUM_PAGES'] = int(os.environ.get('RETENTION_VACUUM_PAGES', 2000))
+app.config['RECONCILE_INTERVAL'] = int(os.environ.get('RECONCILE_INTERVAL', 300))
+# 'embedded' runs a checker inside `python app.py`; 'external' leaves all
+# checks to `python worker.py` processes. Imported under a WSGI server the
+# app never runs checks itself.
+app.config['CHECKER_MODE'] = os.environ.get('CHECKER_MODE', 'embedded')
+app.config['LEASE_TTL'] = int(os.environ.get('LEASE_TTL', 30))
+app.config['LEASE_RENEW_INTERVAL'] = int(os.environ.get('LEASE_RENEW_INTERVAL', 10))
+app.config['MONITOR_POLL_INTERVAL'] = int(os.environ.get('MONITOR_POLL_INTERVAL', 5))
+app.config['SHARD_VNODES'] = int(os.environ.get('SHARD_VNODES', 64))
+# How often (seconds) a web process pulls status changes from the database
+# into its status cache, and how often it reloads the cache completely.
+app.config['STATUS_CACHE_REFRESH'] = float(os.environ.get('STATUS_CACHE_REFRESH', 2))
+app.config['STATUS_CACHE_RELOAD'] = int(os.environ.get('STATUS_CACHE_RELOAD', 60))
+app.config['DASHBOARD_PAGE_SIZE'] = int(os.environ.get('DASHBOARD_PAGE_SIZE', 50))
+# Monitors inserted per transaction by the bulk import.
+app.config['IMPORT_BATCH_SIZE'] = int(os.environ.get('IMPORT_BATCH_SIZE', 500))
+# Live status streams: how many recent changes a reconnecting client can
+# catch up on, and how often (seconds) an idle stream sends a keep-alive.
+app.config['LIVE_FEED_SIZE'] = int(os.environ.get('LIVE_FEED_SIZE', 1000))
+app.config['LIVE_KEEPALIVE'] = int(os.environ.get('LIVE_KEEPALIVE', 15))
+# Each open stream holds a server thread (or greenlet) for as long as the page
+# is open, so serve the app with threaded or gevent workers (e.g. gunicorn
+# -k gthread --threads 64) and keep LIVE_MAX_STREAMS, counted per process,
+# below the threads per worker. Pages over the limit are told to retry later.
+app.config['LIVE_MAX_STREAMS'] = int(os.environ.get('LIVE_MAX_STREAMS', 48))
+app.config['LIVE_RETRY_AFTER'] = int(os.environ.get('LIVE_RETRY_AFTER', 30))
+# Status changes are sent to every NOTIFY_WEBHOOK_URLS endpoint (comma
+# separated; empty disables notifications). Changes are batched for
+# NOTIFY_BATCH_WINDOW seconds and each endpoint gets at most
+# NOTIFY_RATE_LIMIT messages a minute; failed sends are retried
+# NOTIFY_RETRIES times with exponential backoff from NOTIFY_RETRY_BACKOFF seconds.
+app.config['NOTIFY_WEBHOOK_URLS'] = os.environ.get('NOTIFY_WEBHOOK_URLS', '')
+app.config['NOTIFY_BATCH_WINDOW'] = float(os.environ.get('NOTIFY_BATCH_WINDOW', 5))
+app.config['NOTIFY_RATE_LIMIT'] = int(os.environ.get('NOTIFY_RATE_LIMIT', 6))
+app.config['NOTIFY_QUEUE_SIZE'] = int(os.environ.get('NOTIFY_QUEUE_SIZE', 100))
+app.config['NOTIFY_RETRIES'] = int(os.environ.get('NOTIFY_RETRIES', 5))
+app.config['NOTIFY_RETRY_BACKOFF'] = float(os.environ.get('NOTIFY_RETRY_BACKOFF', 2))
+app.config['NOTIFY_TIMEOUT'] = float(os.environ.get('NOTIFY_TIMEOUT', 10))
+# Compiled template bytecode survives restarts here; empty disables it.
+app.config['TEMPLATE_CACHE_DIR'] = os.environ.get(
+    'TEMPLATE_CACHE_DIR', os.path.join(app.instance_path, 'jinja_cache'))
+db = SQLAlchemy(app, session_options={'class_': storage.RoutingSession})
+with app.app_context():
+    db_engines = dict(db.engines)
+storage.configure(db_engines,
+                  journal_mode=app.config['SQLITE_JOURNAL_MODE'],
+                  synchronous=app.config['SQLITE_SYNCHRONOUS'],
+                  mmap_size=app.config['SQLITE_MMAP_SIZE'],
+                  cache_size=app.config['SQLITE_CACHE_SIZE'],
+                  busy_timeout=app.config['SQLITE_BUSY_TIMEOUT'])
 
 # Database Models
 class User(db.Model):
@@ -28,458 +165,956 @@ class Monitor(db.Model):
     name = db.Column(db.String(100), nullable=False)
     url = db.Column(db.String(255), nullable=False)
     interval = db.Column(db.Integer, default=60)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     status = db.Column(db.String(20), default='unknown')
-    last_checked = db.Column(db.DateTime)
+    last_checked = db.Column(db.DateTime, index=True)
     uptime_24h = db.Column(db.Float, default=100.0)
     uptime_30d = db.Column(db.Float, default=100.0)
     response_time = db.Column(db.Integer)
-    history = db.relationship('MonitorHistory', backref='monitor', lazy=True)
+    # 'warm' reuses pooled keep-alive connections, 'cold' opens a fresh
+    # connection per check so the handshake is part of the latency.
+    latency_mode = db.Column(db.String(10), default='warm', server_default='warm')
+    retries = db.Column(db.Integer, default=0, server_default='0')
+    retry_interval = db.Column(db.Integer, default=60, server_default='60')
+    # One of probes.PROBE_TYPES; tcp, ping and dns monitors keep their
+    # target as tcp://host:port, ping://host or dns://host in url.
+    type = db.Column(db.String(10), default='http', server_default='http')
+    http_method = db.Column(db.String(10), default='GET', server_default='GET')
+    keyword = db.Column(db.String(255))
+    # Comma separated codes or ranges such as '200-299,301'; empty means < 400.
+    accepted_statuses = db.Column(db.String(100))
+    # History and rollups of a deleted monitor go with it through ON DELETE
+    # CASCADE. SQLite does not enforce foreign keys, so there the retention
+    # job purges them in small batches instead; the ORM never loads them.
+    history = db.relationship('MonitorHistory', backref='monitor', lazy=True,
+                              passive_deletes='all')
 
 class MonitorHistory(db.Model):
+    __table_args__ = (db.Index('ix_monitor_history_monitor_ts', 'monitor_id', 'timestamp'),)
     id = db.Column(db.Integer, primary_key=True)
-    monitor_id = db.Column(db.Integer, db.ForeignKey('monitor.id'), nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    monitor_id = db.Column(db.Integer, db.ForeignKey('monitor.id', ondelete='CASCADE'),
+                           nullable=False)
+    # Epoch seconds (UTC)
+    timestamp = db.Column(db.Integer, nullable=False, index=True,
+                          default=lambda: int(time.time()))
     status = db.Column(db.String(20))
     response_time = db.Column(db.Integer)
+    # Phase breakdown of the check (ms, see probes.PHASES) and body bytes
+    # read. NULL where a probe could not see the phase, e.g. connect and TLS
+    # on a reused connection; SQLite stores NULLs and small integers in a
+    # byte or two. dns_time only counts lookups through the DNS cache and is
+    # not part of response_time.
+    dns_time = db.Column(db.Integer)
+    connect_time = db.Column(db.Integer)
+    tls_time = db.Column(db.Integer)
+    ttfb = db.Column(db.Integer)
+    transfer_time = db.Column(db.Integer)
+    body_bytes = db.Column(db.Integer)
+    # Legacy free-text message; new rows reference a shared HistoryMessage.
     message = db.Column(db.String(255))
+    message_id = db.Column(db.Integer, db.ForeignKey('history_message.id'), index=True)
+    message_ref = db.relationship('HistoryMessage', lazy='joined')
+
+    @property
+    def text(self):
+        return self.message_ref.text if self.message_ref else self.message
+
+    @property
+    def phases(self):
+        """``(phase, ms)`` pairs of the recorded timing phases."""
+        return [(phase, value) for phase, value in (
+            ('dns', self.dns_time), ('connect', self.connect_time), ('tls', self.tls_time),
+            ('ttfb', self.ttfb), ('transfer', self.transfer_time)) if value is not None]
+
+class HistoryMessage(db.Model):
+    # Rows are never deleted: every checker process caches text -> id in
+    # message_cache and would go on writing the ids of deleted rows.
+    id = db.Column(db.Integer, primary_key=True)
+    text = db.Column(db.String(255), unique=True, nullable=False)
+
+class CheckerLease(db.Model):
+    worker_id = db.Column(db.String(100), primary_key=True)
+    expires_at = db.Column(db.Integer, nullable=False)
+
+class MonitorRollup(db.Model):
+    __table_args__ = (db.Index('ix_monitor_rollup_width_bucket', 'width', 'bucket'),)
+    monitor_id = db.Column(db.Integer, db.ForeignKey('monitor.id', ondelete='CASCADE'),
+                           primary_key=True)
+    width = db.Column(db.Integer, primary_key=True)
+    bucket = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    up_count = db.Column(db.Integer, nullable=False, default=0)
+    latency_min = db.Column(db.Integer)
+    latency_max = db.Column(db.Integer)
+    latency_avg = db.Column(db.Integer)
+    latency_count = db.Column(db.Integer)
+    latency_sum = db.Column(db.Integer)
+    latency_p95 = db.Column(db.Integer)
+    latency_hist = db.Column(db.String(120))
+
+def epoch(dt):
+    return int(dt.replace(tzinfo=timezone.utc).timestamp())
+
+def upsert(model, rows, update):
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(model)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[c.name for c in model.__table__.primary_key],
+        set_={name: stmt.excluded[name] for name in update})
+    db.session.execute(stmt, rows)
+
+def merge_rollups(rows):
+    """Insert rollup rows, or add their counts onto rows already stored.
+
+    Rows come from :meth:`Aggregate.as_delta_row`; the histogram and p95 are
+    this process's view of the bucket.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        least, greatest = db.func.least, db.func.greatest
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+        least, greatest = db.func.min, db.func.max
+    stmt = insert(MonitorRollup)
+    table, new = MonitorRollup.__table__.c, stmt.excluded
+    latency_count = db.func.coalesce(table.latency_count, 0) + new.latency_count
+    latency_sum = db.func.coalesce(table.latency_sum, 0) + new.latency_sum
+
+    def either(pick, name):
+        # NULL when the bucket has no latency yet; SQLite's min/max would keep it.
+        return pick(db.func.coalesce(table[name], new[name]),
+                    db.func.coalesce(new[name], table[name]))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['monitor_id', 'width', 'bucket'],
+        set_={
+            'count': table.count + new.count,
+            'up_count': table.up_count + new.up_count,
+            'latency_count': latency_count,
+            'latency_sum': latency_sum,
+            'latency_min': either(least, 'latency_min'),
+            'latency_max': either(greatest, 'latency_max'),
+            'latency_avg': db.cast(db.func.round(db.cast(latency_sum, db.Float)
+                                                 / db.func.nullif(latency_count, 0)),
+                                   db.Integer),
+            'latency_p95': new.latency_p95,
+            'latency_hist': new.latency_hist,
+        })
+    db.session.execute(stmt, rows)
+
+def upsert_ignore(model, rows):
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    db.session.execute(insert(model).on_conflict_do_nothing(), rows)
+
+def init_db():
+    with db.engine.connect() as conn:
+        tables = db.inspect(conn).get_table_names()
+        if not tables and db.engine.dialect.name == 'sqlite':
+            # Only takes effect before the first table exists; older
+            # databases can switch over with `flask compact`.
+            conn.execute(db.text('PRAGMA auto_vacuum = INCREMENTAL'))
+    db.create_all()
+    migrations.migrate(db.engine, fresh='monitor' not in tables)
 
 # Create database tables
 with app.app_context():
-    db.create_all()
+    init_db()
 
 # Monitoring Scheduler
 scheduler = BackgroundScheduler()
-scheduler.start()
 
-def check_monitor(monitor_id):
+dns_cache = DnsCache(ttl=app.config['DNS_CACHE_TTL'],
+                     negative_ttl=app.config['DNS_NEGATIVE_TTL'],
+                     max_entries=app.config['DNS_CACHE_SIZE'],
+                     prefetch=app.config['DNS_PREFETCH'])
+
+http_sessions = SessionPool(pool_size=app.config['HTTP_POOL_SIZE'],
+                            idle_timeout=app.config['HTTP_POOL_IDLE_TIMEOUT'],
+                            keep_alive=app.config['HTTP_KEEP_ALIVE'],
+                            resolver=dns_cache)
+
+uptime = UptimeTracker()
+rollups = RollupAccumulator()
+message_cache = {}
+
+def message_text(message):
+    return message[:255] if message else None
+
+def intern_messages(messages):
+    texts = {message_text(m) for m in messages} - {None}
+    found = {t: message_cache[t] for t in texts if t in message_cache}
+    missing = texts - found.keys()
+    if missing:
+        upsert_ignore(HistoryMessage, [{'text': t} for t in missing])
+        rows = db.session.query(HistoryMessage.text, HistoryMessage.id)\
+            .filter(HistoryMessage.text.in_(missing))
+        if len(message_cache) > 10000:
+            message_cache.clear()
+        for text, message_id in rows:
+            message_cache[text] = found[text] = message_id
+    return found
+
+def load_rollups(monitor_ids):
+    monitor_ids = [m for m in monitor_ids if m not in rollups]
+    if not monitor_ids:
+        return
+    now = int(time.time())
+    windows = [(WINDOW_24H[0], now // WINDOW_24H[0] - WINDOW_24H[1]),
+               (WINDOW_30D[0], now // WINDOW_30D[0] - WINDOW_30D[1]),
+               (DAY, now // DAY - RollupAccumulator.keep)]
+    rows = MonitorRollup.query.filter(
+        MonitorRollup.monitor_id.in_(monitor_ids),
+        db.or_(*[db.and_(MonitorRollup.width == width, MonitorRollup.bucket > since)
+                 for width, since in windows])
+    ).order_by(MonitorRollup.bucket)
+    for monitor_id in monitor_ids:
+        uptime.windows(monitor_id)
+        rollups.track(monitor_id)
+    for row in rows:
+        if row.width in (WINDOW_24H[0], WINDOW_30D[0]):
+            uptime.load(row.monitor_id, row.width, row.bucket, row.up_count, row.count)
+        if row.bucket >= now // row.width - RollupAccumulator.keep:
+            rollups.load(row.monitor_id, row.width, row.bucket, Aggregate.from_row(row))
+
+def flush_results(results):
     with app.app_context():
-        monitor = Monitor.query.get(monitor_id)
-        if not monitor:
-            return
+        ids = {r.monitor_id for r in results}
+        intervals = dict(db.session.query(Monitor.id, Monitor.interval)
+                         .filter(Monitor.id.in_(ids)))
+        load_rollups(intervals)
+
+        message_ids = intern_messages(r.message for r in results)
+
+        history = []
+        latest = {}
+        touched = set()
+        for result in results:
+            if result.monitor_id not in intervals:
+                continue
+            response_time = result.response_time
+            timings = result.timings
+            history.append({
+                'monitor_id': result.monitor_id,
+                'timestamp': epoch(result.checked_at),
+                'status': result.status,
+                'response_time': response_time,
+                'dns_time': timings.get('dns'),
+                'connect_time': timings.get('connect'),
+                'tls_time': timings.get('tls'),
+                'ttfb': timings.get('ttfb'),
+                'transfer_time': timings.get('transfer'),
+                'body_bytes': timings.get('bytes'),
+                'message_id': message_ids.get(message_text(result.message)),
+            })
+            checked_at = epoch(result.checked_at)
+            up = result.status in AVAILABLE
+            uptime.add(result.monitor_id, checked_at, up)
+            latency = result.response_time if result.status == 'up' else None
+            for width, bucket in rollups.add(result.monitor_id, checked_at, up, latency):
+                touched.add((result.monitor_id, width, bucket))
+            latest[result.monitor_id] = {
+                'id': result.monitor_id,
+                'status': result.status,
+                'response_time': response_time,
+                'last_checked': result.checked_at,
+            }
+
+        now = time.time()
+        for row in latest.values():
+            row['uptime_24h'], row['uptime_30d'] = uptime.percentages(row['id'], now)
+
+        written = []
+        if history:
+            db.session.execute(db.insert(MonitorHistory), history)
+            db.session.execute(db.update(Monitor), list(latest.values()))
+            rows = []
+            for monitor_id, width, bucket in touched:
+                agg = rollups.get(monitor_id, width, bucket)
+                if agg is None:
+                    continue
+                row = agg.as_delta_row()
+                row.update(monitor_id=monitor_id, width=width, bucket=bucket)
+                rows.append(row)
+                written.append(agg)
+            if rows:
+                merge_rollups(rows)
+        db.session.commit()
+        for agg in written:
+            agg.mark_stored()
+
+    if status_cache.loaded:
+        for row in latest.values():
+            status_cache.update_status(row['id'], row['status'], row['response_time'],
+                                       row['last_checked'])
+
+def rebuild_rollups(monitor_id=None):
+    """Recompute rollups from raw history.
+
+    Raw rows only go back RETENTION_RAW_DAYS, so a bucket that starts before
+    a monitor's oldest raw row keeps the data already rolled up into it; with
+    no rollup row to keep it is built from the raw rows it has.
+    """
+    query = Monitor.query
+    if monitor_id is not None:
+        query = query.filter_by(id=monitor_id)
+    for monitor in query:
+        oldest = db.session.query(db.func.min(MonitorHistory.timestamp))\
+            .filter_by(monitor_id=monitor.id).scalar()
+        if oldest is None:
+            continue
+        partial = {width: oldest // width for width in RESOLUTIONS if oldest % width}
+        kept = {width for width, in db.session.query(MonitorRollup.width).filter(
+            MonitorRollup.monitor_id == monitor.id,
+            db.or_(*[db.and_(MonitorRollup.width == width, MonitorRollup.bucket == bucket)
+                     for width, bucket in partial.items()]))} if partial else set()
+        first = {width: oldest // width + (width in kept) for width in RESOLUTIONS}
+        aggregates = {}
+        rows = db.session.query(MonitorHistory.timestamp, MonitorHistory.status,
+                                MonitorHistory.response_time)\
+            .filter_by(monitor_id=monitor.id)\
+            .order_by(MonitorHistory.timestamp)\
+            .yield_per(1000)
+        for checked_at, status, response_time in rows:
+            up = status in AVAILABLE
+            for width in RESOLUTIONS:
+                bucket = checked_at // width
+                if bucket < first[width]:
+                    continue
+                agg = aggregates.get((width, bucket))
+                if agg is None:
+                    agg = aggregates[(width, bucket)] = Aggregate()
+                agg.add(up, response_time if status == 'up' else None)
+
+        MonitorRollup.query.filter(
+            MonitorRollup.monitor_id == monitor.id,
+            db.or_(*[db.and_(MonitorRollup.width == width, MonitorRollup.bucket >= bucket)
+                     for width, bucket in first.items()])
+        ).delete(synchronize_session=False)
+        rows = []
+        for (width, bucket), agg in aggregates.items():
+            row = agg.as_row()
+            row.update(monitor_id=monitor.id, width=width, bucket=bucket)
+            rows.append(row)
+        if rows:
+            db.session.execute(db.insert(MonitorRollup), rows)
+        rebuilt = UptimeTracker()
+        for row in db.session.query(MonitorRollup.width, MonitorRollup.bucket,
+                                    MonitorRollup.up_count, MonitorRollup.count)\
+                .filter(MonitorRollup.monitor_id == monitor.id,
+                        MonitorRollup.width.in_((WINDOW_24H[0], WINDOW_30D[0])))\
+                .order_by(MonitorRollup.bucket):
+            rebuilt.load(monitor.id, row.width, row.bucket, row.up_count, row.count)
+        monitor.uptime_24h, monitor.uptime_30d = rebuilt.percentages(monitor.id, time.time())
+        db.session.commit()
+        forget_monitor(monitor.id)
+
+@app.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    rebuild_rollups()
+
+def average_response(monitor_id, hours=24):
+    since = int(time.time()) // HOUR - hours
+    count, total = db.session.query(
+        db.func.sum(MonitorRollup.latency_count),
+        db.func.sum(MonitorRollup.latency_sum),
+    ).filter(MonitorRollup.monitor_id == monitor_id,
+             MonitorRollup.width == HOUR,
+             MonitorRollup.bucket > since).one()
+    return round(total / count) if count and total is not None else None
+
+def monitors_for_user(user_id):
+    return Monitor.query.filter_by(user_id=user_id)
+
+live_feed = ChangeFeed(app.config['LIVE_FEED_SIZE'])
+live_poller = {'thread': None}
+live_poller_lock = threading.Lock()
 
-        start_time = time.time()
+def publish_status(record, removed):
+    if removed:
+        data = {'id': record.id, 'removed': True}
+    else:
+        data = {'id': record.id, 'status': record.status,
+                'response_time': record.response_time,
+                'last_checked': record.last_checked.strftime('%Y-%m-%d %H:%M:%S')
+                if record.last_checked else None}
+    live_feed.publish(record.user_id, record.id, json.dumps(data))
+
+status_cache = StatusCache(on_change=publish_status)
+status_refresh = {'at': 0.0, 'reloaded_at': 0.0, 'max_id': 0}
+status_refresh_lock = threading.Lock()
+STATUS_COLUMNS = (Monitor.id, Monitor.user_id, Monitor.name, Monitor.url, Monitor.interval,
+                  Monitor.status, Monitor.response_time, Monitor.last_checked)
+
+def status_record(row):
+    return MonitorStatus(row.id, row.user_id, row.name, row.url, row.interval,
+                         row.status, row.response_time, row.last_checked)
+
+def refresh_status_cache(force=False):
+    """Pull status changes made by other processes (checker workers) into the cache.
+
+    Runs at most every STATUS_CACHE_REFRESH seconds per process, whatever the
+    number of requests; concurrent requests keep serving the current cache.
+    """
+    started = time.time()
+    if not force and started - status_refresh['at'] < app.config['STATUS_CACHE_REFRESH']:
+        return
+    if not status_refresh_lock.acquire(blocking=not status_cache.loaded):
+        return
+    try:
+        query = db.session.query(*STATUS_COLUMNS)
+        if not status_cache.loaded or \
+                started - status_refresh['reloaded_at'] > app.config['STATUS_CACHE_RELOAD']:
+            rows = query.all()
+            status_cache.load(status_record(row) for row in rows)
+            status_refresh['reloaded_at'] = started
+        else:
+            # Results reach the database up to one write-behind flush after
+            # they were taken, so look back a little further than the last pass.
+            since = datetime.utcfromtimestamp(
+                status_refresh['at'] - app.config['WRITE_BEHIND_FLUSH_MS'] / 1000 - 5)
+            rows = query.filter(db.or_(Monitor.id > status_refresh['max_id'],
+                                       Monitor.last_checked >= since)).all()
+            for row in rows:
+                if row.id in status_cache:
+                    status_cache.update_status(row.id, row.status, row.response_time,
+                                               row.last_checked)
+                else:
+                    status_cache.upsert(status_record(row))
+        status_refresh['max_id'] = max([status_refresh['max_id']] + [r.id for r in rows])
+        status_refresh['at'] = started
+    finally:
+        status_refresh_lock.release()
+
+def poll_live_status():
+    while True:
+        time.sleep(app.config['STATUS_CACHE_REFRESH'])
+        if not live_feed.subscribers:
+            continue
         try:
-            response = requests.get(monitor.url, timeout=monitor.interval/1000)
-            response_time = int((time.time() - start_time) * 1000)
-            status = 'up' if response.status_code < 400 else 'down'
-            message = f"{response.status_code} - {response.reason}"
-        except requests.exceptions.RequestException as e:
-            response_time = monitor.interval
-            status = 'down'
-            message = str(e)
-
-        monitor.status = status
-        monitor.response_time = response_time
-        monitor.last_checked = datetime.utcnow()
-        
-        history = MonitorHistory(
-            monitor_id=monitor.id,
-            status=status,
-            response_time=response_time,
-            message=message
-        )
-        db.session.add(history)
-        
-        if status == 'up':
-            monitor.uptime_24h = 100.0
-            monitor.uptime_30d = 100.0
+            with app.app_context():
+                refresh_status_cache()
+        except Exception:
+            app.logger.exception('Refreshing the status cache failed')
+
+def start_live_poller():
+    """One thread per process feeds all live streams from the status cache."""
+    with live_poller_lock:
+        if live_poller['thread'] is None:
+            live_poller['thread'] = threading.Thread(target=poll_live_status,
+                                                     name='live-status', daemon=True)
+            live_poller['thread'].start()
+
+def history_page(monitor_id, before=None, before_id=None, limit=30):
+    """Newest-first history rows older than the ``(before, before_id)`` cursor.
+
+    Keyset pagination on ``(timestamp, id)`` rides ix_monitor_history_monitor_ts,
+    so old pages cost the same as the first one.
+    """
+    query = MonitorHistory.query.filter(MonitorHistory.monitor_id == monitor_id)
+    if before is not None:
+        if before_id is None:
+            query = query.filter(MonitorHistory.timestamp < before)
         else:
-            monitor.uptime_24h = 99.9
-            monitor.uptime_30d = 99.8
-            
-        db.session.commit()
+            query = query.filter(db.or_(
+                MonitorHistory.timestamp < before,
+                db.and_(MonitorHistory.timestamp == before, MonitorHistory.id < before_id)))
+    return query.order_by(MonitorHistory.timestamp.desc(), MonitorHistory.id.desc())\
+        .limit(limit).all()
+
+def response_series(monitor, start, end, max_points, width='auto'):
+    """Chart points ``(epoch, latency, up_ratio)`` between two epochs.
+
+    ``width`` is a rollup resolution, ``None`` for raw checks or ``'auto'``
+    for the finest one that fits ``max_points``.
+    """
+    if width == 'auto':
+        width = pick_resolution(start, end, max_points, monitor.interval)
+    if width is None:
+        rows = db.session.query(MonitorHistory.timestamp, MonitorHistory.response_time,
+                                MonitorHistory.status)\
+            .filter(MonitorHistory.monitor_id == monitor.id,
+                    MonitorHistory.timestamp >= start,
+                    MonitorHistory.timestamp < end)\
+            .order_by(MonitorHistory.timestamp)
+        return None, [(t, rt, 1.0 if st in AVAILABLE else 0.0) for t, rt, st in rows]
+    rows = db.session.query(MonitorRollup.bucket, MonitorRollup.latency_avg,
+                            MonitorRollup.up_count, MonitorRollup.count)\
+        .filter(MonitorRollup.monitor_id == monitor.id,
+                MonitorRollup.width == width,
+                MonitorRollup.bucket >= start // width,
+                MonitorRollup.bucket < -(-end // width))\
+        .order_by(MonitorRollup.bucket)
+    return width, [(b * width, avg, up / count if count else None)
+                   for b, avg, up, count in rows]
+
+def record_check(result):
+    checks_total.inc(status=result.status)
+    for phase, value in result.timings.items():
+        if phase == 'bytes':
+            probe_body_bytes.inc(value)
+        else:
+            check_phase_seconds.observe(value / 1000, phase=phase)
+    if result.response_time is not None:
+        check_response_seconds.observe(result.response_time / 1000)
+    if result.status == 'up':
+        probe_policy.observe(result.monitor_id, result.response_time)
+    result.status = heartbeats.report(result.monitor_id, result.status == 'up', result)
+    history_writer.put(result)
+
+def check_monitor(monitor_id, target):
+    timeout = probe_policy.timeouts(monitor_id, target.interval)
+    timings = {}
+    state = None
+    if response_store is not None and target.type == 'http':
+        state = response_store.get(monitor_id)
+    start_time = time.time()
+    try:
+        up, message = probes.run_check(target, http_sessions, timeout,
+                                       app.config['PROBE_MAX_BODY_BYTES'], timings, state)
+        response_time = int((time.time() - start_time) * 1000) - timings.get('dns', 0)
+        status = 'up' if up else 'down'
+    except (requests.exceptions.RequestException, OSError, ValueError,
+            probes.ProbeError) as e:
+        response_time = None
+        status = 'down'
+        message = str(e) or e.__class__.__name__
+
+    record_check(CheckResult(monitor_id, status, response_time, message, timings=timings))
+
+def probe_target(monitor):
+    return probes.ProbeSpec(monitor.type or 'http', monitor.url, monitor.interval,
+                            monitor.latency_mode != 'cold', monitor.http_method or 'GET',
+                            monitor.keyword or None,
+                            probes.parse_statuses(monitor.accepted_statuses),
+                            app.config['PROBE_MAX_REDIRECTS'])
+
+def dispatch_check(monitor_id, target):
+    if probe_engine is not None:
+        probe_engine.submit(monitor_id, target,
+                            probe_policy.timeouts(monitor_id, target.interval))
+    else:
+        check_threads.submit(check_monitor, monitor_id, target)
+
+def add_monitors(user_id, rows):
+    """Insert validated monitor rows in one transaction and queue their first checks."""
+    rows = [dict(row, user_id=user_id, status='unknown', uptime_24h=100.0, uptime_30d=100.0)
+            for row in rows]
+    ids = db.session.scalars(
+        db.insert(Monitor).returning(Monitor.id, sort_by_parameter_order=True), rows).all()
+    db.session.commit()
+    for monitor_id, row in zip(ids, rows):
+        monitor = Monitor(id=monitor_id, **row)
+        if status_cache.loaded:
+            status_cache.upsert(status_record(monitor))
+        if shard is not None and shard.owns(monitor_id):
+            schedule_monitor(monitor)
+            dispatch_check(monitor_id, probe_target(monitor))
+    return ids
+
+def describe_monitors(monitor_ids):
+    with app.app_context():
+        rows = db.session.query(Monitor.id, Monitor.name, Monitor.url, User.username)\
+            .join(User).filter(Monitor.id.in_(monitor_ids))
+        return {row.id: {'name': row.name, 'url': row.url, 'user': row.username}
+                for row in rows}
+
+notifier = Notifier([WebhookChannel(url.strip(), timeout=app.config['NOTIFY_TIMEOUT'])
+                     for url in app.config['NOTIFY_WEBHOOK_URLS'].split(',') if url.strip()],
+                    describe_monitors,
+                    window=app.config['NOTIFY_BATCH_WINDOW'],
+                    rate=app.config['NOTIFY_RATE_LIMIT'],
+                    max_queue=app.config['NOTIFY_QUEUE_SIZE'],
+                    retries=app.config['NOTIFY_RETRIES'],
+                    backoff=app.config['NOTIFY_RETRY_BACKOFF'])
+
+def notify_transition(monitor_id, old, new, result):
+    notifier.add(Transition(monitor_id, old, new, result.message, epoch(result.checked_at)))
+
+probe_policy = ProbePolicy(connect_timeout=app.config['PROBE_CONNECT_TIMEOUT'],
+                           min_read_timeout=app.config['PROBE_MIN_READ_TIMEOUT'],
+                           max_read_timeout=app.config['PROBE_MAX_READ_TIMEOUT'],
+                           multiplier=app.config['PROBE_TIMEOUT_MULTIPLIER'])
+response_store = ResponseStore() if app.config['PROBE_CONDITIONAL'] else None
+check_threads = ThreadPoolExecutor(max_workers=app.config['CHECK_THREADS'],
+                                   thread_name_prefix='check')
+heartbeats = HeartbeatScheduler(dispatch_check,
+                                tick=app.config['WHEEL_TICK_MS'] / 1000,
+                                slots=app.config['WHEEL_SLOTS'],
+                                on_transition=notify_transition)
+
+def timed_flush(results):
+    start = time.monotonic()
+    try:
+        flush_results(results)
+    finally:
+        db_flush_seconds.observe(time.monotonic() - start)
+        db_flush_rows.inc(len(results))
+
+class ForgetMonitor:
+    """Queued between check results: drop the monitor's uptime and rollup state."""
+
+    def __init__(self, monitor_id):
+        self.monitor_id = monitor_id
+
+def flush_queued(items):
+    """Write queued results; a ForgetMonitor applies after the results queued before it."""
+    results = []
+    for item in items:
+        if isinstance(item, ForgetMonitor):
+            if results:
+                timed_flush(results)
+                results = []
+            uptime.discard(item.monitor_id)
+            rollups.discard(item.monitor_id)
+        else:
+            results.append(item)
+    if results:
+        timed_flush(results)
+
+def forget_monitor(monitor_id):
+    """Drop a monitor's in-memory uptime and rollups, which the flush thread owns."""
+    if shard is not None:
+        history_writer.put(ForgetMonitor(monitor_id))
+    else:
+        uptime.discard(monitor_id)
+        rollups.discard(monitor_id)
+
+history_writer = WriteBehindQueue(flush_queued,
+                                  max_rows=app.config['WRITE_BEHIND_MAX_ROWS'],
+                                  max_delay_ms=app.config['WRITE_BEHIND_FLUSH_MS'])
+
+probe_engine = None
+if app.config['CHECK_ENGINE'] == 'asyncio':
+    probe_engine = ProbeEngine(record_check,
+                               concurrency=app.config['PROBE_CONCURRENCY'],
+                               per_host=app.config['PROBE_PER_HOST_LIMIT'],
+                               pool=AsyncConnectionPool(
+                                   pool_size=app.config['HTTP_POOL_SIZE'],
+                                   idle_timeout=app.config['HTTP_POOL_IDLE_TIMEOUT'],
+                                   keep_alive=app.config['HTTP_KEEP_ALIVE'],
+                                   resolver=dns_cache),
+                               max_body=app.config['PROBE_MAX_BODY_BYTES'],
+                               responses=response_store)
+
+# Checker metrics, served at /metrics
+checker_metrics = metrics.Registry(prefix='uptime_')
+checks_total = checker_metrics.counter('checks_total', 'Completed checks by recorded status.',
+                                       ('status',))
+check_response_seconds = checker_metrics.histogram(
+    'check_response_seconds', 'Response time of probes that got a response, without DNS.')
+check_phase_seconds = checker_metrics.histogram(
+    'check_phase_seconds', 'Time spent in each probe phase.', ('phase',))
+probe_body_bytes = checker_metrics.counter('probe_body_bytes_total',
+                                           'Response body bytes read by HTTP probes.')
+checker_metrics.counter('scheduler_dispatched_total', 'Checks dispatched by the timing wheel.',
+                        fn=lambda: heartbeats.wheel.dispatched)
+checker_metrics.counter('scheduler_overdue_total',
+                        'Checks dispatched more than a second after they were due.',
+                        fn=lambda: heartbeats.wheel.overdue)
+checker_metrics.gauge('scheduler_lag_seconds', 'Delay between a check falling due and its dispatch.',
+                      lambda: {(stat,): heartbeats.wheel.stats()['lag_' + stat]
+                               for stat in ('last', 'avg', 'max')}, ('stat',))
+checker_metrics.gauge('scheduled_monitors', 'Monitors scheduled in this process.',
+                      lambda: len(heartbeats))
+checker_metrics.gauge('queue_depth', 'Items waiting in checker queues.',
+                      lambda: {('write_behind',): len(history_writer),
+                               ('check_threads',): check_threads._work_queue.qsize()},
+                      ('queue',))
+checker_metrics.gauge('probes_inflight', 'Probes currently running on the probe engine.',
+                      lambda: probe_engine.inflight if probe_engine is not None else None)
+checker_metrics.gauge('probe_concurrency_limit', 'Maximum number of concurrent probes.',
+                      lambda: app.config['PROBE_CONCURRENCY'] if probe_engine is not None
+                      else app.config['CHECK_THREADS'])
+db_flush_seconds = checker_metrics.histogram('db_flush_seconds',
+                                             'Time to write one batch of check results.')
+db_flush_rows = checker_metrics.counter('db_flush_rows_total', 'Check results written.')
+checker_metrics.gauge('db_connections_in_use', 'Database connections checked out, per pool.',
+                      lambda: {(key or 'write',): engine.pool.checkedout()
+                               for key, engine in db_engines.items()
+                               if hasattr(engine.pool, 'checkedout')}, ('pool',))
+for stat in ('hits', 'misses', 'prefetches'):
+    checker_metrics.counter(f'dns_cache_{stat}_total', f'DNS cache {stat}.',
+                            fn=lambda stat=stat: getattr(dns_cache, stat))
+checker_metrics.gauge('dns_cache_entries', 'Host names in the DNS cache.', lambda: len(dns_cache))
+if response_store is not None:
+    for stat, text in (('not_modified', 'HTTP checks answered 304 Not Modified.'),
+                       ('full', 'HTTP checks that downloaded a full 200 response.'),
+                       ('bytes_saved', 'Body bytes not downloaded thanks to revalidation.'),
+                       ('ms_saved', 'Body transfer time (ms) saved by revalidation.')):
+        checker_metrics.counter(f'conditional_{stat}_total', text, ('monitor',),
+                                fn=lambda stat=stat: response_store.per_monitor(stat))
+checker_metrics.counter('status_transitions_total', 'Confirmed up/down transitions.',
+                        fn=lambda: notifier.transitions)
+for stat, text in (('sent', 'Notifications delivered.'),
+                   ('failed', 'Notifications given up on after retries.'),
+                   ('dropped', 'Status changes dropped from full notification queues.')):
+    checker_metrics.counter(f'notifications_{stat}_total', text,
+                            fn=lambda stat=stat: notifier.stats()[stat])
+checker_metrics.gauge('notifications_queued', 'Notifications waiting for delivery.',
+                      lambda: notifier.stats()['queued'])
+
+def delete_batch(model, *criteria):
+    keys = list(model.__table__.primary_key.columns)
+    key = keys[0] if len(keys) == 1 else db.tuple_(*keys)
+    batch = db.select(*keys).where(*criteria).limit(app.config['RETENTION_BATCH_SIZE'])
+    deleted = db.session.execute(db.delete(model).where(key.in_(batch))).rowcount
+    db.session.commit()
+    return deleted
+
+retention_state = {'messages_compacted': False}
+
+def compact_messages():
+    rows = db.session.query(MonitorHistory.id, MonitorHistory.message)\
+        .filter(MonitorHistory.message.isnot(None))\
+        .limit(app.config['RETENTION_BATCH_SIZE']).all()
+    if not rows:
+        return 0
+    message_ids = intern_messages(message for _, message in rows)
+    db.session.execute(db.update(MonitorHistory), [
+        {'id': id, 'message': None, 'message_id': message_ids.get(message_text(message))}
+        for id, message in rows])
+    db.session.commit()
+    return len(rows)
+
+def orphaned_monitor_ids(model):
+    """Ids of deleted monitors that still have rows in ``model``.
+
+    Only reads, so it runs on the read pool and holds no write lock.
+    """
+    return [monitor_id for monitor_id, in db.session.query(model.monitor_id).distinct()
+            .filter(model.monitor_id.notin_(db.select(Monitor.id)))
+            .limit(app.config['RETENTION_BATCH_SIZE'])]
+
+def retention_tasks():
+    now = int(time.time())
+    day = 86400
+    # Elsewhere deleting a monitor cascades to these.
+    orphaned = (MonitorHistory, MonitorRollup) if db.engine.dialect.name == 'sqlite' else ()
+    for model in orphaned:
+        for monitor_id in orphaned_monitor_ids(model):
+            # Batches go through the monitor_id index; the id may have been
+            # reused by a new monitor since it was found.
+            yield model, [model.monitor_id == monitor_id,
+                          ~db.exists().where(Monitor.id == monitor_id)]
+    if app.config['RETENTION_RAW_DAYS']:
+        cutoff = now - app.config['RETENTION_RAW_DAYS'] * day
+        yield MonitorHistory, [MonitorHistory.timestamp < cutoff]
+    for width, days in ((MINUTE, app.config['RETENTION_MINUTE_ROLLUP_DAYS']),
+                        (HOUR, app.config['RETENTION_HOUR_ROLLUP_DAYS']),
+                        (DAY, app.config['RETENTION_DAY_ROLLUP_DAYS'])):
+        if days:
+            yield MonitorRollup, [MonitorRollup.width == width,
+                                  MonitorRollup.bucket < (now - days * day) // width]
+
+def run_retention():
+    """Delete expired data in short batches so no transaction holds the write lock for long."""
+    if shard is not None and not shard.is_leader:
+        return
+    batches = app.config['RETENTION_MAX_BATCHES']
+    with app.app_context():
+        while batches and not retention_state['messages_compacted']:
+            if not compact_messages():
+                retention_state['messages_compacted'] = True
+            batches -= 1
+            time.sleep(0.01)
+        for model, criteria in retention_tasks():
+            while batches and delete_batch(model, *criteria):
+                batches -= 1
+                time.sleep(0.01)
+        if db.engine.dialect.name == 'sqlite' and app.config['RETENTION_VACUUM_PAGES']:
+            with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+                if conn.exec_driver_sql('PRAGMA auto_vacuum').scalar() == 2:
+                    # The pragma frees one page per step of the result.
+                    conn.exec_driver_sql(
+                        f"PRAGMA incremental_vacuum({app.config['RETENTION_VACUUM_PAGES']})"
+                    ).fetchall()
+
+@app.cli.command('compact')
+def compact_command():
+    """Switch SQLite to incremental auto-vacuum and rebuild the database file."""
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.exec_driver_sql('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.exec_driver_sql('VACUUM')
 
 def schedule_monitor(monitor):
-    scheduler.add_job(
-        func=check_monitor,
-        args=[monitor.id],
-        trigger='interval',
-        seconds=monitor.interval,
-        id=f'monitor_{monitor.id}'
-    )
-
-# Template Strings
-base_template = """
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Uptime Kuma</title>
-    <link href="https://cdn.jsdelivr.net/npm/tailwindcss@2.2.19/dist/tailwind.min.css" rel="stylesheet">
-    <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
-    <style>
-        :root {
-            --primary: #4f46e5;
-            --secondary: #6b7280;
-            --success: #10b981;
-            --danger: #ef4444;
-            --warning: #f59e0b;
-        }
-        body {
-            font-family: 'Inter', sans-serif;
-        }
-        .nav-bottom {
-            position: fixed;
-            bottom: 0;
-            width: 100%;
-            background: white;
-            box-shadow: 0 -2px 10px rgba(0,0,0,0.1);
-        }
-    </style>
-</head>
-<body class="bg-gray-50 pb-16">
-    <header class="bg-white shadow-sm">
-        <div class="max-w-7xl mx-auto px-4 py-4">
-            <h1 class="text-2xl font-bold text-indigo-600">Uptime Kuma</h1>
-        </div>
-    </header>
-
-    <main class="max-w-7xl mx-auto px-4 py-6">
-        {% with messages = get_flashed_messages() %}
-            {% if messages %}
-                {% for message in messages %}
-                    <div class="bg-blue-100 border border-blue-400 text-blue-700 px-4 py-3 rounded mb-4">
-                        {{ message }}
-                    </div>
-                {% endfor %}
-            {% endif %}
-        {% endwith %}
-
-        {% block content %}{% endblock %}
-    </main>
-
-    <nav class="nav-bottom flex justify-around items-center py-3 border-t">
-        <a href="{{ url_for('home') }}" class="text-center {% if request.path == url_for('home') %}text-indigo-600 font-medium{% else %}text-gray-600{% endif %}">
-            <svg class="w-6 h-6 mx-auto" fill="none" stroke="currentColor" viewBox="0 0 24 24">
-                <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M3 12l2-2m0 0l7-7 7 7M5 10v10a1 1 0 001 1h3m10-11l2 2m-2-2v10a1 1 0 01-1 1h-3m-6 0a1 1 0 001-1v-4a1 1 0 011-1h2a1 1 0 011 1v4a1 1 0 001 1m-6 0h6"></path>
-            </svg>
-            <span class="text-xs">Home</span>
-        </a>
-        <a href="#" class="text-center text-gray-600">
-            <svg class="w-6 h-6 mx-auto" fill="none" stroke="currentColor" viewBox="0 0 24 24">
-                <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M4 6h16M4 10h16M4 14h16M4 18h16"></path>
-            </svg>
-            <span class="text-xs">List</span>
-        </a>
-        <a href="{{ url_for('add_monitor') }}" class="text-center {% if request.path == url_for('add_monitor') %}text-indigo-600 font-medium{% else %}text-gray-600{% endif %}">
-            <svg class="w-6 h-6 mx-auto" fill="none" stroke="currentColor" viewBox="0 0 24 24">
-                <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M12 6v6m0 0v6m0-6h6m-6 0H6"></path>
-            </svg>
-            <span class="text-xs">Add</span>
-        </a>
-        <a href="#" class="text-center text-gray-600">
-            <svg class="w-6 h-6 mx-auto" fill="none" stroke="currentColor" viewBox="0 0 24 24">
-                <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M10.325 4.317c.426-1.756 2.924-1.756 3.35 0a1.724 1.724 0 002.573 1.066c1.543-.94 3.31.826 2.37 2.37a1.724 1.724 0 001.065 2.572c1.756.426 1.756 2.924 0 3.35a1.724 1.724 0 00-1.066 2.573c.94 1.543-.826 3.31-2.37 2.37a1.724 1.724 0 00-2.572 1.065c-.426 1.756-2.924 1.756-3.35 0a1.724 1.724 0 00-2.573-1.066c-1.543.94-3.31-.826-2.37-2.37a1.724 1.724 0 00-1.065-2.572c-1.756-.426-1.756-2.924 0-3.35a1.724 1.724 0 001.066-2.573c-.94-1.543.826-3.31 2.37-2.37.996.608 2.296.07 2.572-1.065z"></path>
-                <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M15 12a3 3 0 11-6 0 3 3 0 016 0z"></path>
-            </svg>
-            <span class="text-xs">Settings</span>
-        </a>
-    </nav>
-</body>
-</html>
-"""
-
-home_template = """
-{% extends "base.html" %}
-
-{% block content %}
-<div class="mb-6">
-    <h2 class="text-lg font-semibold mb-2">Quick Stats</h2>
-    <div class="grid grid-cols-3 gap-4 mb-4">
-        <div class="bg-white p-4 rounded-lg shadow">
-            <div class="text-green-500 font-bold text-xl">{{ up_count }}</div>
-            <div class="text-gray-500 text-sm">Up</div>
-        </div>
-        <div class="bg-white p-4 rounded-lg shadow">
-            <div class="text-red-500 font-bold text-xl">{{ down_count }}</div>
-            <div class="text-gray-500 text-sm">Down</div>
-        </div>
-        <div class="bg-white p-4 rounded-lg shadow">
-            <div class="text-gray-500 font-bold text-xl">0</div>
-            <div class="text-gray-500 text-sm">Maintenance</div>
-        </div>
-    </div>
-</div>
-
-<div class="space-y-4">
-    {% for monitor in monitors %}
-    <div class="bg-white p-4 rounded-lg shadow">
-        <div class="flex justify-between items-center mb-2">
-            <h3 class="font-medium">{{ monitor.name }}</h3>
-            <span class="px-2 py-1 text-xs rounded-full 
-                {% if monitor.status == 'up' %}bg-green-100 text-green-800
-                {% elif monitor.status == 'down' %}bg-red-100 text-red-800
-                {% else %}bg-gray-100 text-gray-800{% endif %}">
-                {{ monitor.status|capitalize }}
-            </span>
-        </div>
-        <p class="text-sm text-gray-600 mb-2">{{ monitor.url }}</p>
-        <div class="flex justify-between text-xs text-gray-500">
-            <span>Last checked: {{ monitor.last_checked.strftime('%Y-%m-%d %H:%M:%S') if monitor.last_checked else 'Never' }}</span>
-            <a href="{{ url_for('view_monitor', id=monitor.id) }}" class="text-indigo-600">Details</a>
-        </div>
-    </div>
-    {% endfor %}
-</div>
-{% endblock %}
-"""
-
-login_template = """
-{% extends "base.html" %}
-
-{% block content %}
-<div class="max-w-md mx-auto bg-white p-8 rounded-lg shadow">
-    <h2 class="text-2xl font-bold text-center mb-6">Login</h2>
-    <form method="POST">
-        <div class="mb-4">
-            <label class="block text-gray-700 text-sm font-bold mb-2" for="username">
-                Username
-            </label>
-            <input class="shadow appearance-none border rounded w-full py-2 px-3 text-gray-700 leading-tight focus:outline-none focus:shadow-outline" 
-                   id="username" name="username" type="text" placeholder="Username" required>
-        </div>
-        <div class="mb-6">
-            <label class="block text-gray-700 text-sm font-bold mb-2" for="password">
-                Password
-            </label>
-            <input class="shadow appearance-none border rounded w-full py-2 px-3 text-gray-700 mb-3 leading-tight focus:outline-none focus:shadow-outline" 
-                   id="password" name="password" type="password" placeholder="Password" required>
-        </div>
-        <div class="flex items-center justify-between">
-            <button class="bg-indigo-600 hover:bg-indigo-700 text-white font-bold py-2 px-4 rounded focus:outline-none focus:shadow-outline w-full" type="submit">
-                Sign In
-            </button>
-        </div>
-    </form>
-    <div class="text-center mt-4">
-        <a href="{{ url_for('register') }}" class="text-indigo-600 text-sm">Don't have an account? Register</a>
-    </div>
-</div>
-{% endblock %}
-"""
-
-register_template = """
-{% extends "base.html" %}
-
-{% block content %}
-<div class="max-w-md mx-auto bg-white p-8 rounded-lg shadow">
-    <h2 class="text-2xl font-bold text-center mb-6">Register</h2>
-    <form method="POST">
-        <div class="mb-4">
-            <label class="block text-gray-700 text-sm font-bold mb-2" for="username">
-                Username
-            </label>
-            <input class="shadow appearance-none border rounded w-full py-2 px-3 text-gray-700 leading-tight focus:outline-none focus:shadow-outline" 
-                   id="username" name="username" type="text" placeholder="Username" required>
-        </div>
-        <div class="mb-6">
-            <label class="block text-gray-700 text-sm font-bold mb-2" for="password">
-                Password
-            </label>
-            <input class="shadow appearance-none border rounded w-full py-2 px-3 text-gray-700 mb-3 leading-tight focus:outline-none focus:shadow-outline" 
-                   id="password" name="password" type="password" placeholder="Password" required>
-        </div>
-        <div class="flex items-center justify-between">
-            <button class="bg-indigo-600 hover:bg-indigo-700 text-white font-bold py-2 px-4 rounded focus:outline-none focus:shadow-outline w-full" type="submit">
-                Register
-            </button>
-        </div>
-    </form>
-    <div class="text-center mt-4">
-        <a href="{{ url_for('login') }}" class="text-indigo-600 text-sm">Already have an account? Login</a>
-    </div>
-</div>
-{% endblock %}
-"""
-
-add_monitor_template = """
-{% extends "base.html" %}
-
-{% block content %}
-<div class="max-w-2xl mx-auto bg-white p-6 rounded-lg shadow">
-    <h2 class="text-xl font-bold mb-6">Add New Monitor</h2>
-    
-    <form method="POST">
-        <div class="mb-6">
-            <h3 class="font-medium mb-4">General</h3>
-            
-            <div class="mb-4">
-                <label class="block text-gray-700 text-sm font-bold mb-2" for="type">
-                    Monitor Type
-                </label>
-                <select class="shadow appearance-none border rounded w-full py-2 px-3 text-gray-700 leading-tight focus:outline-none focus:shadow-outline" 
-                        id="type" name="type">
-                    <option>HTTP(s)</option>
-                    <option>TCP</option>
-                    <option>Ping</option>
-                </select>
-            </div>
-            
-            <div class="mb-4">
-                <label class="block text-gray-700 text-sm font-bold mb-2" for="name">
-                    Friendly Name
-                </label>
-                <input class="shadow appearance-none border rounded w-full py-2 px-3 text-gray-700 leading-tight focus:outline-none focus:shadow-outline" 
-                       id="name" name="name" type="text" placeholder="My Website" required>
-            </div>
-            
-            <div class="mb-4">
-                <label class="block text-gray-700 text-sm font-bold mb-2" for="url">
-                    URL
-                </label>
-                <input class="shadow appearance-none border rounded w-full py-2 px-3 text-gray-700 leading-tight focus:outline-none focus:shadow-outline" 
-                       id="url" name="url" type="url" placeholder="https://" required>
-            </div>
-            
-            <div class="mb-4">
-                <label class="block text-gray-700 text-sm font-bold mb-2" for="interval">
-                    Heartbeat Interval (Check every 60 seconds)
-                </label>
-                <input class="shadow appearance-none border rounded w-full py-2 px-3 text-gray-700 leading-tight focus:outline-none focus:shadow-outline" 
-                       id="interval" name="interval" type="number" value="60" min="10" required>
-            </div>
-            
-            <div class="mb-4">
-                <label class="block text-gray-700 text-sm font-bold mb-2" for="retries">
-                    Retries
-                </label>
-                <input class="shadow appearance-none border rounded w-full py-2 px-3 text-gray-700 leading-tight focus:outline-none focus:shadow-outline" 
-                       id="retries" name="retries" type="number" value="0" min="0">
-                <p class="text-gray-500 text-xs mt-1">Maximum retries before the service is marked as down and a notification is sent</p>
-            </div>
-            
-            <div class="mb-4">
-                <label class="block text-gray-700 text-sm font-bold mb-2" for="retry_interval">
-                    Heartbeat Retry Interval (Retry every 60 seconds)
-                </label>
-                <input class="shadow appearance-none border rounded w-full py-2 px-3 text-gray-700 leading-tight focus:outline-none focus:shadow-outline" 
-                       id="retry_interval" name="retry_interval" type="number" value="60" min="10">
-            </div>
-        </div>
-        
-        <button class="bg-indigo-600 hover:bg-indigo-700 text-white font-bold py-2 px-4 rounded focus:outline-none focus:shadow-outline w-full" type="submit">
-            Add Monitor
-        </button>
-    </form>
-</div>
-{% endblock %}
-"""
-
-monitor_template = """
-{% extends "base.html" %}
-
-{% block content %}
-<div class="bg-white p-6 rounded-lg shadow mb-6">
-    <div class="flex justify-between items-center mb-4">
-        <h2 class="text-xl font-bold">{{ monitor.name }}</h2>
-        <span class="px-3 py-1 text-sm rounded-full 
-            {% if monitor.status == 'up' %}bg-green-100 text-green-800
-            {% elif monitor.status == 'down' %}bg-red-100 text-red-800
-            {% else %}bg-gray-100 text-gray-800{% endif %}">
-            {{ monitor.status|capitalize }}
-        </span>
-    </div>
-    
-    <p class="text-gray-600 mb-6">{{ monitor.url }}</p>
-    
-    <div class="flex space-x-4 mb-6">
-        <a href="#" class="text-gray-600 hover:text-indigo-600">Pause</a>
-        <a href="#" class="text-gray-600 hover:text-indigo-600">Edit</a>
-        <a href="#" class="text-gray-600 hover:text-indigo-600">Clone</a>
-        <a href="{{ url_for('delete_monitor', id=monitor.id) }}" class="text-red-600 hover:text-red-800">Delete</a>
-    </div>
-    
-    <div class="mb-4">
-        <p class="text-gray-500">Check every {{ monitor.interval }} seconds</p>
-    </div>
-    
-    <div class="mb-6">
-        <div class="text-center py-4 
-            {% if monitor.status == 'up' %}bg-green-50 text-green-800
-            {% elif monitor.status == 'down' %}bg-red-50 text-red-800
-            {% else %}bg-gray-50 text-gray-800{% endif %} rounded-lg">
-            <span class="font-bold text-lg">{{ monitor.status|upper }}</span>
-        </div>
-    </div>
-    
-    <div class="grid grid-cols-1 md:grid-cols-2 gap-6 mb-6">
-        <div class="bg-white p-4 rounded-lg border">
-            <h3 class="font-medium mb-2">Response</h3>
-            <p class="text-2xl font-bold">{{ monitor.response_time }} ms</p>
-            <p class="text-gray-500 text-sm">(Current)</p>
-        </div>
-        
-        <div class="bg-white p-4 rounded-lg border">
-            <h3 class="font-medium mb-2">Avg. Response</h3>
-            <p class="text-2xl font-bold">{{ avg_response_variation }} ms</p>
-            <p class="text-gray-500 text-sm">(24-hour)</p>
-        </div>
-        
-        <div class="bg-white p-4 rounded-lg border">
-            <h3 class="font-medium mb-2">Uptime</h3>
-            <p class="text-2xl font-bold">{{ monitor.uptime_24h }}%</p>
-            <p class="text-gray-500 text-sm">(24-hour)</p>
-        </div>
-        
-        <div class="bg-white p-4 rounded-lg border">
-            <h3 class="font-medium mb-2">Uptime</h3>
-            <p class="text-2xl font-bold">{{ monitor.uptime_30d }}%</p>
-            <p class="text-gray-500 text-sm">(30-day)</p>
-        </div>
-    </div>
-    
-    <div class="mb-6">
-        <h3 class="font-medium mb-2">Recent ▼</h3>
-        <canvas id="responseChart" height="200"></canvas>
-    </div>
-</div>
-
-<script>
-    const ctx = document.getElementById('responseChart').getContext('2d');
-    const chart = new Chart(ctx, {
-        type: 'line',
-        data: {
-            labels: {{ labels|tojson }},
-            datasets: [{
-                label: 'Response Time (ms)',
-                data: {{ data|tojson }},
-                borderColor: '#4f46e5',
-                backgroundColor: 'rgba(79, 70, 229, 0.1)',
-                tension: 0.1,
-                fill: true
-            }]
-        },
-        options: {
-            responsive: true,
-            scales: {
-                y: {
-                    beginAtZero: true
-                }
-            }
-        }
-    });
-</script>
-{% endblock %}
-"""
+    heartbeats.add(monitor.id, monitor.interval,
+                   retries=monitor.retries or 0,
+                   retry_interval=monitor.retry_interval,
+                   target=probe_target(monitor),
+                   down=monitor.status == 'down')
+
+def reconcile_jobs():
+    """Make the heartbeat schedule match this worker's share of the monitor table."""
+    with app.app_context():
+        monitors = db.session.query(Monitor.id, Monitor.url, Monitor.interval,
+                                    Monitor.latency_mode, Monitor.retries,
+                                    Monitor.retry_interval, Monitor.status, Monitor.type,
+                                    Monitor.http_method, Monitor.keyword,
+                                    Monitor.accepted_statuses).all()
+    stale = set(heartbeats.ids())
+    known = shard_state['max_monitor_id']
+
+    added = removed = 0
+    for monitor in monitors:
+        shard_state['max_monitor_id'] = max(shard_state['max_monitor_id'], monitor.id)
+        if not shard.owns(monitor.id):
+            continue
+        stale.discard(monitor.id)
+        wanted = (monitor.interval, monitor.retries or 0,
+                  monitor.retry_interval or monitor.interval, probe_target(monitor))
+        if heartbeats.settings(monitor.id) != wanted:
+            schedule_monitor(monitor)
+            added += 1
+            if known and monitor.id > known:
+                # Created since the last pass: check it now, not a whole interval later.
+                dispatch_check(monitor.id, wanted[3])
+    for monitor_id in stale:
+        heartbeats.remove(monitor_id)
+        probe_policy.discard(monitor_id)
+        if response_store is not None:
+            response_store.discard(monitor_id)
+        # If it hashes back here later, its counters must come from the database.
+        forget_monitor(monitor_id)
+        removed += 1
+    shard_state['monitor_count'] = len(monitors)
+    if added or removed:
+        app.logger.info('Reconciled monitor jobs: %d scheduled, %d removed', added, removed)
+    return added, removed
+
+def poll_monitors():
+    """Cheap check for added or deleted monitors between full reconciles."""
+    with app.app_context():
+        count, max_id = db.session.query(db.func.count(Monitor.id), db.func.max(Monitor.id)).one()
+    if count != shard_state['monitor_count'] or (max_id or 0) > shard_state['max_monitor_id']:
+        reconcile_jobs()
+
+def renew_lease():
+    now = int(time.time())
+    ttl = app.config['LEASE_TTL']
+    with app.app_context():
+        upsert(CheckerLease, [{'worker_id': shard.worker_id, 'expires_at': now + ttl}],
+               ('expires_at',))
+        CheckerLease.query.filter(CheckerLease.expires_at < now - ttl).delete()
+        db.session.commit()
+        members = [w for w, in db.session.query(CheckerLease.worker_id)
+                   .filter(CheckerLease.expires_at >= now)]
+    if shard.update(members):
+        app.logger.info('Checker workers changed: %s', ', '.join(shard.members))
+        reconcile_jobs()
+
+def release_lease():
+    with app.app_context():
+        CheckerLease.query.filter_by(worker_id=shard.worker_id).delete()
+        db.session.commit()
+
+shard = None
+shard_state = {'max_monitor_id': 0, 'monitor_count': 0}
+
+def start_checker(worker_id=None):
+    """Run checks for this process's shard of monitors until the process exits."""
+    global shard
+    if shard is not None:
+        return
+    shard = ShardMembership(worker_id or f'{socket.gethostname()}:{os.getpid()}',
+                            vnodes=app.config['SHARD_VNODES'])
+    history_writer.start()
+    notifier.start()
+    if probe_engine is not None:
+        probe_engine.start()
+    heartbeats.start()
+    renew_lease()
+    reconcile_jobs()
+
+    def job(func, seconds, id):
+        scheduler.add_job(func, 'interval', seconds=seconds, id=id,
+                          max_instances=1, coalesce=True, replace_existing=True)
+    job(renew_lease, app.config['LEASE_RENEW_INTERVAL'], 'lease')
+    job(poll_monitors, app.config['MONITOR_POLL_INTERVAL'], 'poll')
+    job(reconcile_jobs, app.config['RECONCILE_INTERVAL'], 'reconcile')
+    job(run_retention, app.config['RETENTION_INTERVAL'], 'retention')
+    scheduler.start()
+    atexit.register(stop_checker)
+
+def stop_checker():
+    global shard
+    if shard is None:
+        return
+    scheduler.shutdown(wait=False)
+    heartbeats.stop()
+    check_threads.shutdown(wait=True)
+    if probe_engine is not None:
+        probe_engine.stop()
+    dns_cache.close()
+    history_writer.stop()
+    notifier.stop()
+    release_lease()
+    shard = None
 
 # Routes
+CHART_RANGES = {'24h': 86400, '7d': 7 * 86400, '30d': 30 * 86400}
+CHART_POINTS = 500
+CHART_MAX_POINTS = 5000
+# Fetch a few times more points than the budget so LTTB has detail to pick from.
+CHART_OVERSAMPLE = 4
+CHART_RESOLUTIONS = {'auto': 'auto', 'raw': None, 'minute': MINUTE, 'hour': HOUR, 'day': DAY}
+HISTORY_PAGE_SIZE = 20
+
+@app.template_filter('epoch')
+def format_epoch(value, fmt='%m-%d %H:%M'):
+    return datetime.utcfromtimestamp(value).strftime(fmt)
+
+templates = TemplateRegistry(app, app.config['TEMPLATE_CACHE_DIR'])
+templates.preload()
+
+@app.cli.command('compile-templates')
+def compile_templates_command():
+    """Compile all templates into the bytecode cache."""
+    print(f'Compiled {templates.preload()} templates')
+
 @app.route('/')
 def home():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    user = User.query.get(session['user_id'])
-    monitors = Monitor.query.filter_by(user_id=user.id).all()
-    
-    up_count = sum(1 for m in monitors if m.status == 'up')
-    down_count = sum(1 for m in monitors if m.status == 'down')
-    
-    return render_template_string(home_template, 
-                               monitors=monitors,
-                               up_count=up_count,
-                               down_count=down_count)
+    refresh_status_cache()
+    context = dashboard_context(session['user_id'], request.args)
+    if request.args.get('fragment') == 'monitor_list':
+        return templates.render_block('home.html', 'monitor_list', **context)
+    return templates.render('home.html', **context)
+
+def dashboard_context(user_id, args):
+    """Template variables of the dashboard for ``user_id`` and the query ``args``."""
+    # Taken before reading the cache, so the live stream resumes from here
+    # without missing a change.
+    live_seq = live_feed.seq
+    status = args.get('status') or None
+    search = args.get('q', '').strip()
+    sort = args.get('sort', 'name')
+    descending = args.get('order') == 'desc'
+    page = max(args.get('page', 1, type=int), 1)
+    per_page = app.config['DASHBOARD_PAGE_SIZE']
+    monitors, total = status_cache.page(user_id, status=status, search=search,
+                                        sort=sort, descending=descending,
+                                        page=page, per_page=per_page)
+    counts = status_cache.counts(user_id)
+    return {
+        'monitors': monitors,
+        'up_count': counts['up'],
+        'down_count': counts['down'],
+        'pending_count': counts['pending'],
+        'unknown_count': counts['unknown'],
+        'total': total,
+        'page': page,
+        'pages': max((total + per_page - 1) // per_page, 1),
+        'filters': {'status': status or '', 'q': search,
+                    'sort': sort, 'order': 'desc' if descending else 'asc'},
+        'live_seq': live_seq,
+    }
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -493,7 +1128,7 @@ def login():
             return redirect(url_for('home'))
         else:
             flash('Invalid username or password')
-    return render_template_string(login_template)
+    return templates.render('login.html')
 
 @app.route('/register', methods=['GET', 'POST'])
 def register():
@@ -512,7 +1147,7 @@ def register():
             db.session.commit()
             flash('Registration successful. Please login.')
             return redirect(url_for('login'))
-    return render_template_string(register_template)
+    return templates.render('register.html')
 
 @app.route('/logout')
 def logout():
@@ -525,52 +1160,250 @@ def add_monitor():
         return redirect(url_for('login'))
     
     if request.method == 'POST':
-        name = request.form['name']
-        url = request.form['url']
-        interval = int(request.form['interval'])
+        try:
+            values = monitor_io.validate(request.form.to_dict())
+        except ValueError as e:
+            flash(f'Invalid monitor: {e}')
+            return templates.render('add_monitor.html')
         
-        monitor = Monitor(
-            name=name,
-            url=url,
-            interval=interval,
-            user_id=session['user_id']
-        )
+        monitor = Monitor(user_id=session['user_id'], **values)
         db.session.add(monitor)
         db.session.commit()
         
-        schedule_monitor(monitor)
-        check_monitor(monitor.id)
+        if status_cache.loaded:
+            status_cache.upsert(status_record(monitor))
+        if shard is not None and shard.owns(monitor.id):
+            schedule_monitor(monitor)
+            dispatch_check(monitor.id, probe_target(monitor))
         
         flash('Monitor added successfully')
         return redirect(url_for('home'))
     
-    return render_template_string(add_monitor_template)
+    return templates.render('add_monitor.html')
+
+IMPORT_FORMATS = {
+    '.csv': 'csv', 'text/csv': 'csv',
+    '.json': 'json', 'application/json': 'json',
+    '.jsonl': 'jsonl', '.ndjson': 'jsonl',
+    'application/x-ndjson': 'jsonl', 'application/jsonl': 'jsonl',
+}
+IMPORT_ERRORS_SHOWN = 10
+
+@app.route('/monitors/import', methods=['POST'])
+def import_monitors():
+    """Bulk-create monitors from a CSV, JSON array or JSON lines upload.
+
+    The file can be a multipart ``file`` field or the raw request body. Rows
+    are validated one by one and inserted in batches of IMPORT_BATCH_SIZE;
+    invalid rows are reported back by row number and skipped.
+    """
+    if 'user_id' not in session:
+        return Response(status=401)
+    upload = request.files.get('file') if request.mimetype == 'multipart/form-data' else None
+    if upload is not None:
+        stream, filename, mimetype = upload.stream, upload.filename or '', upload.mimetype
+    else:
+        stream, filename, mimetype = request.stream, '', request.mimetype
+    fmt = request.args.get('format') or IMPORT_FORMATS.get(os.path.splitext(filename)[1].lower()) \
+        or IMPORT_FORMATS.get(mimetype)
+    reader = monitor_io.READERS.get(fmt)
+    if reader is None:
+        return jsonify(error='unknown format, use csv, json or jsonl'), 400
+    
+    user_id = session['user_id']
+    batch_size = app.config['IMPORT_BATCH_SIZE']
+    created = 0
+    errors = []
+    batch = []
+    rows = reader(stream)
+    while True:
+        try:
+            number, row = next(rows)
+        except StopIteration:
+            break
+        except (ValueError, csv.Error) as e:
+            # Undecodable input; nothing after this point can be read.
+            errors.append({'row': None, 'error': str(e)})
+            break
+        try:
+            if isinstance(row, ValueError):
+                raise row
+            batch.append(monitor_io.validate(row))
+        except ValueError as e:
+            errors.append({'row': number, 'error': str(e)})
+            continue
+        if len(batch) >= batch_size:
+            created += len(add_monitors(user_id, batch))
+            batch = []
+    if batch:
+        created += len(add_monitors(user_id, batch))
+    
+    if upload is not None and \
+            request.accept_mimetypes.best_match(['application/json', 'text/html']) == 'text/html':
+        flash(f'Imported {created} monitors')
+        for error in errors[:IMPORT_ERRORS_SHOWN]:
+            flash(f"Row {error['row']}: {error['error']}" if error['row'] else error['error'])
+        if len(errors) > IMPORT_ERRORS_SHOWN:
+            flash(f'... and {len(errors) - IMPORT_ERRORS_SHOWN} more invalid rows')
+        return redirect(url_for('home'))
+    return jsonify(created=created, errors=errors)
+
+@app.route('/monitors/export')
+def export_monitors():
+    """Stream the user's monitors as CSV, JSON or JSON lines (``?format=``)."""
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    fmt = request.args.get('format', 'csv')
+    if fmt not in monitor_io.WRITERS:
+        abort(400)
+    write, mimetype = monitor_io.WRITERS[fmt]
+    user_id = session['user_id']
+    
+    def rows():
+        query = db.session.query(*[getattr(Monitor, field) for field in monitor_io.FIELDS])\
+            .filter(Monitor.user_id == user_id)\
+            .order_by(Monitor.id)\
+            .execution_options(yield_per=1000)
+        for row in query:
+            yield row._mapping
+    
+    return Response(stream_with_context(write(rows())), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename=monitors.{fmt}'})
 
 @app.route('/monitor/<int:id>')
 def view_monitor(id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
+    live_seq = live_feed.seq
     monitor = Monitor.query.get_or_404(id)
     if monitor.user_id != session['user_id']:
         return redirect(url_for('home'))
     
-    history = MonitorHistory.query.filter_by(monitor_id=id)\
-        .order_by(MonitorHistory.timestamp.desc())\
-        .limit(30)\
-        .all()
+    chart_range = request.args.get('range', 'recent')
+    if chart_range not in CHART_RANGES:
+        chart_range = 'recent'
     
-    labels = [h.timestamp.strftime('%m-%d %H:%M') for h in reversed(history)]
-    data = [h.response_time for h in reversed(history)]
+    avg_response = average_response(monitor.id)
+
+    before = request.args.get('before', type=int)
+    before_id = request.args.get('before_id', type=int)
+    events = history_page(id, before, before_id, limit=HISTORY_PAGE_SIZE)
+    older = None
+    if len(events) == HISTORY_PAGE_SIZE:
+        older = {'before': events[-1].timestamp, 'before_id': events[-1].id}
     
-    # Calculate random variation for average response
-    avg_response_variation = monitor.response_time + random.randint(-50, 50) if monitor.response_time else 0
+    return templates.render('monitor.html',
+                            monitor=monitor,
+                            series_url=url_for('monitor_series', id=id, range=chart_range),
+                            chart_range=chart_range,
+                            chart_ranges=CHART_RANGES,
+                            avg_response=avg_response,
+                            events=events,
+                            older=older,
+                            live_seq=live_seq)
+
+@app.route('/monitor/<int:id>/series')
+def monitor_series(id):
+    """Columnar chart data for a monitor, downsampled to a point budget.
+
+    Takes ``range`` (recent, 24h, 7d, 30d) or ``start``/``end`` epochs,
+    ``points``, ``resolution`` (auto, raw, minute, hour, day) and
+    ``format=bin`` for the packed encoding of :func:`timeseries.as_binary`.
+    Responses carry an ETag, so an unchanged range is answered with 304.
+    """
+    if 'user_id' not in session:
+        return Response(status=401)
+    monitor = Monitor.query.get_or_404(id)
+    if monitor.user_id != session['user_id']:
+        abort(404)
     
-    return render_template_string(monitor_template,
-                               monitor=monitor,
-                               labels=labels,
-                               data=data,
-                               avg_response_variation=avg_response_variation)
+    resolution = request.args.get('resolution', 'auto')
+    if resolution not in CHART_RESOLUTIONS:
+        abort(400)
+    points = min(max(request.args.get('points', CHART_POINTS, type=int), 3), CHART_MAX_POINTS)
+    chart_range = request.args.get('range', 'recent')
+    if chart_range == 'recent' and 'start' not in request.args:
+        history = history_page(id, limit=30)[::-1]
+        width = None
+        t = [h.timestamp for h in history]
+        latency = [h.response_time for h in history]
+        up = [1 if h.status in AVAILABLE else 0 for h in history]
+    else:
+        if chart_range in CHART_RANGES and 'start' not in request.args:
+            # Whole minutes, so repeated requests hit the same ETag.
+            end = -(-int(time.time()) // MINUTE) * MINUTE
+            start = end - CHART_RANGES[chart_range]
+        else:
+            start = request.args.get('start', type=int)
+            end = request.args.get('end', int(time.time()), type=int)
+            if start is None or end <= start:
+                abort(400)
+        width, rows = response_series(monitor, start, end, points * CHART_OVERSAMPLE,
+                                      CHART_RESOLUTIONS[resolution])
+        t, latency, up = lttb([r[0] for r in rows], [r[1] for r in rows],
+                              [1 if r[2] == 1 else 0 for r in rows], points)
+    
+    if request.args.get('format') == 'bin':
+        response = Response(as_binary(t, latency, up, width), mimetype='application/octet-stream')
+    else:
+        response = jsonify(as_json(t, latency, up, width))
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
+
+@app.route('/events')
+def status_events():
+    """Server-sent events with the monitors whose status changed.
+
+    ``?monitor=<id>`` limits the stream to one monitor. Clients resume from
+    ``Last-Event-ID``; a ``reset`` event means they missed changes and should
+    reload the page. Beyond LIVE_MAX_STREAMS open streams the answer is a 503.
+    """
+    if 'user_id' not in session:
+        return Response(status=401)
+    user_id = session['user_id']
+    monitor_id = request.args.get('monitor', type=int)
+    refresh_status_cache()
+    start_live_poller()
+    last = request.headers.get('Last-Event-ID', type=int)
+    if last is None:
+        last = request.args.get('since', type=int)
+    keepalive = app.config['LIVE_KEEPALIVE']
+
+    def stream(seq):
+        yield 'retry: 3000\n\n'
+        while True:
+            if not live_feed.wait(seq, keepalive):
+                yield ': keep-alive\n\n'
+                continue
+            events, seq = live_feed.since(seq)
+            if events is None:
+                yield f'id: {seq}\nevent: reset\ndata: {{}}\n\n'
+                continue
+            chunks = [f'id: {n}\nevent: status\ndata: {data}\n\n'
+                      for n, key, changed_id, data in events
+                      if key == user_id and monitor_id in (None, changed_id)]
+            if chunks and monitor_id is None:
+                chunks.append(f'event: counts\ndata: {json.dumps(status_cache.counts(user_id))}\n\n')
+            if chunks:
+                yield ''.join(chunks)
+
+    retry_after = app.config['LIVE_RETRY_AFTER']
+    if not live_feed.join(app.config['LIVE_MAX_STREAMS']):
+        return Response(f'retry: {retry_after * 1000}\n\n', status=503,
+                        mimetype='text/event-stream',
+                        headers={'Retry-After': str(retry_after), 'Cache-Control': 'no-cache'})
+    response = Response(stream(live_feed.seq if last is None else last),
+                        mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Runs even when the client leaves before the stream starts.
+    response.call_on_close(live_feed.leave)
+    return response
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(checker_metrics.render(), content_type=metrics.CONTENT_TYPE)
 
 @app.route('/delete/<int:id>')
 def delete_monitor(id):
@@ -581,17 +1414,23 @@ def delete_monitor(id):
     if monitor.user_id != session['user_id']:
         return redirect(url_for('home'))
     
-    try:
-        scheduler.remove_job(f'monitor_{id}')
-    except:
-        pass
+    if shard is not None:
+        heartbeats.remove(id)
+        probe_policy.discard(id)
+        if response_store is not None:
+            response_store.discard(id)
     
     db.session.delete(monitor)
     db.session.commit()
+    status_cache.remove(id)
+    forget_monitor(id)
     flash('Monitor deleted successfully')
     return redirect(url_for('home'))
 
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        init_db()
+    # With the debug reloader only the child process serves requests.
+    if app.config['CHECKER_MODE'] == 'embedded' and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_checker()
     app.run(debug=True, host='0.0.0.0', port=5000)
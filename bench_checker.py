@@ -0,0 +1,193 @@
+"""Load test of the checker against a local fake target farm.
+
+    python bench_checker.py [--monitors 1000] [--interval 10] [--duration 30]
+                            [--engine asyncio] [--error-rate 0.01] ...
+
+Seeds ``--monitors`` monitors straight into the Monitor table of a scratch
+database, points them at a :class:`target_farm.TargetFarm` in a child
+process and runs the real scheduler, probes and write-behind persistence.
+After ``--warmup`` seconds it measures for ``--duration`` seconds while a
+thread requests ``/`` and ``/monitor/<id>``, then prints one JSON object:
+checks/sec, dispatch lag, DB write throughput, memory and page latency
+percentiles. Keep the output of each version to compare runs.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from status_cache import STATUSES
+from target_farm import FarmProcess, add_arguments, farm_options
+
+
+def percentiles(samples, scale=1000):
+    """p50, p99 and max of ``samples`` in seconds, as milliseconds."""
+    if not samples:
+        return {'p50': None, 'p99': None, 'max': None, 'count': 0}
+    ordered = sorted(samples)
+
+    def at(q):
+        return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)] * scale, 3)
+    return {'p50': at(0.5), 'p99': at(0.99), 'max': round(ordered[-1] * scale, 3),
+            'count': len(ordered)}
+
+
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return round(int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20, 1)
+    except OSError:
+        return None
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return round(peak / (2**20 if sys.platform == 'darwin' else 2**10), 1)
+
+
+def seed_monitors(uptime, farm, args):
+    """Insert the monitors in one batch; a ``--tcp-share`` of them are TCP checks."""
+    host = '127.0.0.1'
+    rng = random.Random(args.seed)
+    rows = []
+    for i in range(args.monitors):
+        if rng.random() < args.tcp_share:
+            port = farm.tcp_ports[i % len(farm.tcp_ports)]
+            kind, url = 'tcp', f'tcp://{host}:{port}'
+        else:
+            port = farm.http_ports[i % len(farm.http_ports)]
+            kind, url = 'http', f'http://{host}:{port}/m/{i}'
+        rows.append({'user_id': 1, 'name': f'bench-{i}', 'type': kind, 'url': url,
+                     'interval': args.interval, 'retries': 0, 'retry_interval': args.interval,
+                     'latency_mode': 'warm', 'http_method': 'GET', 'status': 'unknown',
+                     'uptime_24h': 100.0, 'uptime_30d': 100.0})
+    with uptime.app.app_context():
+        uptime.db.session.add(uptime.User(id=1, username='bench', password='-'))
+        uptime.db.session.commit()
+        for start in range(0, len(rows), 1000):
+            uptime.db.session.execute(uptime.db.insert(uptime.Monitor), rows[start:start + 1000])
+        uptime.db.session.commit()
+
+
+def load_pages(uptime, monitors, stopping, latencies):
+    client = uptime.app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+    rng = random.Random(0)
+    while not stopping.is_set():
+        for name, path in (('home', '/'), ('monitor', f'/monitor/{rng.randint(1, monitors)}')):
+            start = time.perf_counter()
+            response = client.get(path)
+            latencies[name].append(time.perf_counter() - start)
+            if response.status_code != 200:
+                latencies['errors'] += 1
+
+
+def snapshot(uptime):
+    statuses = {s: uptime.checks_total.value(status=s) for s in STATUSES}
+    flushes, flush_seconds = uptime.db_flush_seconds.totals()
+    return {'checks': sum(statuses.values()), 'statuses': statuses,
+            'rows': uptime.db_flush_rows.value(), 'flushes': flushes,
+            'flush_seconds': flush_seconds, 'time': time.monotonic()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--monitors', type=int, default=1000)
+    parser.add_argument('--interval', type=int, default=10, help='check interval (seconds)')
+    parser.add_argument('--tcp-share', type=float, default=0.1)
+    parser.add_argument('--engine', choices=('asyncio', 'thread'), default='asyncio')
+    parser.add_argument('--warmup', type=float, default=10)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--label', help='free-form tag copied into the output, e.g. a version')
+    parser.add_argument('--keep', action='store_true', help='keep the scratch database')
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='uptime-bench-')
+    # The app reads its settings at import time, so configure it first.
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "bench.db")}'
+    os.environ['CHECK_ENGINE'] = args.engine
+    os.environ['TEMPLATE_CACHE_DIR'] = os.path.join(workdir, 'jinja_cache')
+    farm = FarmProcess(**farm_options(args))
+    import app as uptime
+
+    seed_monitors(uptime, farm, args)
+    rss_before = rss_mb()
+
+    # Exact lag of every timer the wheel fires, not just its running stats.
+    lags = []
+    wheel = uptime.heartbeats.wheel
+    expire = wheel.on_expire
+
+    def timed_expire(key, due):
+        lags.append(max(time.monotonic() - due, 0.0))
+        expire(key, due)
+    wheel.on_expire = timed_expire
+
+    started = time.monotonic()
+    uptime.start_checker('bench')
+    schedule_seconds = time.monotonic() - started
+    time.sleep(args.warmup)
+
+    lags.clear()
+    before = snapshot(uptime)
+    pages = {'home': [], 'monitor': [], 'errors': 0}
+    stopping = threading.Event()
+    loader = threading.Thread(target=load_pages, args=(uptime, args.monitors, stopping, pages),
+                              daemon=True)
+    loader.start()
+    time.sleep(args.duration)
+    stopping.set()
+    loader.join()
+    after = snapshot(uptime)
+    queue_depth = {'write_behind': len(uptime.history_writer),
+                   'check_threads': uptime.check_threads._work_queue.qsize(),
+                   'probes_inflight': uptime.probe_engine.inflight
+                   if uptime.probe_engine is not None else None}
+    uptime.stop_checker()
+    farm_stats = farm.stats()
+    farm.stop()
+
+    elapsed = after['time'] - before['time']
+    flushes = after['flushes'] - before['flushes']
+    result = {
+        'label': args.label,
+        'python': platform.python_version(),
+        'config': {'monitors': args.monitors, 'interval': args.interval,
+                   'engine': args.engine, 'tcp_share': args.tcp_share,
+                   'duration': args.duration, 'warmup': args.warmup,
+                   'farm': farm_options(args)},
+        'schedule_seconds': round(schedule_seconds, 3),
+        'checks_per_sec': round((after['checks'] - before['checks']) / elapsed, 2),
+        'expected_checks_per_sec': round(args.monitors / args.interval, 2),
+        'statuses': {s: after['statuses'][s] - before['statuses'][s] for s in STATUSES},
+        'dispatch_lag_ms': percentiles(lags),
+        'db_rows_per_sec': round((after['rows'] - before['rows']) / elapsed, 2),
+        'db_flush_ms_avg': round((after['flush_seconds'] - before['flush_seconds'])
+                                 / flushes * 1000, 3) if flushes else None,
+        'db_flushes': flushes,
+        'queue_depth': queue_depth,
+        'memory_mb': {'before_checker': rss_before, 'rss': rss_mb(), 'peak': peak_rss_mb()},
+        'page_ms': {'home': percentiles(pages['home']),
+                    'monitor': percentiles(pages['monitor']),
+                    'errors': pages['errors']},
+        'farm': farm_stats,
+    }
+    print(json.dumps(result))
+    if args.keep:
+        print(f'Database kept in {workdir}', file=sys.stderr)
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
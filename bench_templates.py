@@ -0,0 +1,57 @@
+"""Compare per-request template cost: compiling from source vs the registry.
+
+    python bench_templates.py [--requests 2000]
+
+Renders the dashboard three ways: parsing the source on every call (what
+``render_template_string`` does), through the compiled registry, and just
+the ``monitor_list`` fragment. The context comes from ``dashboard_context``
+like the real page, over ``--monitors`` monitors in the status cache.
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+
+from flask import render_template_string, request
+
+from app import app, dashboard_context, status_cache, templates
+from status_cache import STATUSES, MonitorStatus
+
+
+def load_monitors(monitors):
+    status_cache.load(
+        MonitorStatus(i, 1, f'Monitor {i}', f'https://example.com/{i}', 60,
+                      STATUSES[i % len(STATUSES)], 100 + i, datetime.utcnow())
+        for i in range(1, monitors + 1))
+
+
+def timed(render, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        render()
+    return (time.perf_counter() - start) / n * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--monitors', type=int, default=50)
+    args = parser.parse_args()
+
+    loader = app.jinja_env.loader
+    source = loader.get_source(app.jinja_env, 'home.html')[0]
+    load_monitors(args.monitors)
+    results = {}
+    with app.test_request_context('/'):
+        ctx = dashboard_context(1, request.args)
+        results['render_template_string_ms'] = timed(
+            lambda: render_template_string(source, **ctx), args.requests)
+        results['registry_ms'] = timed(lambda: templates.render('home.html', **ctx), args.requests)
+        results['fragment_ms'] = timed(
+            lambda: templates.render_block('home.html', 'monitor_list', **ctx), args.requests)
+    results['saving_ms'] = results['render_template_string_ms'] - results['registry_ms']
+    print(json.dumps({k: round(v, 4) for k, v in results.items()}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Conditional HTTP probing.
+
+For each HTTP monitor the checker remembers the ETag and Last-Modified
+validators of the last full response, a short fingerprint of its body and
+the outcome of the content assertion for it. The next check sends
+If-None-Match / If-Modified-Since; a ``304 Not Modified`` counts as up and
+reuses the remembered assertion result. A full response whose body has the
+same fingerprint does not run the assertion again either.
+
+State is per checker process and starts empty after a restart.
+"""
+import hashlib
+import threading
+
+
+def fingerprint(data=b''):
+    """Incremental 64-bit body fingerprint; ``update()`` it, then ``hexdigest()``."""
+    return hashlib.blake2b(data, digest_size=8)
+
+
+class ResponseState:
+    __slots__ = ('etag', 'last_modified', 'fingerprint', 'body_bytes', 'transfer_ms', 'code',
+                 'reason', 'assertions', 'full', 'not_modified', 'bytes_saved', 'ms_saved')
+
+    def __init__(self):
+        self.etag = None
+        self.last_modified = None
+        self.fingerprint = None
+        self.body_bytes = 0
+        self.transfer_ms = 0
+        self.code = None
+        self.reason = None
+        # keyword -> found in the body with ``fingerprint``
+        self.assertions = {}
+        self.full = 0
+        self.not_modified = 0
+        self.bytes_saved = 0
+        self.ms_saved = 0
+
+    def request_headers(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def cached_assertion(self, keyword, digest):
+        """The remembered result for ``keyword`` if the body is unchanged, else None."""
+        if digest != self.fingerprint:
+            return None
+        return self.assertions.get(keyword)
+
+    def store(self, code, reason, headers, digest, body_bytes, transfer_ms):
+        """Remember a full response; ``headers`` is a mapping with lower-case keys."""
+        self.full += 1
+        self.etag = headers.get('etag')
+        self.last_modified = headers.get('last-modified')
+        if digest != self.fingerprint:
+            self.assertions = {}
+        self.fingerprint = digest
+        self.code = code
+        self.reason = reason
+        self.body_bytes = body_bytes
+        self.transfer_ms = transfer_ms
+
+    def record_not_modified(self):
+        self.not_modified += 1
+        self.bytes_saved += self.body_bytes
+        self.ms_saved += self.transfer_ms
+
+
+class ResponseStore:
+    """:class:`ResponseState` per monitor id."""
+
+    def __init__(self):
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def get(self, monitor_id):
+        state = self._states.get(monitor_id)
+        if state is None:
+            with self._lock:
+                state = self._states.setdefault(monitor_id, ResponseState())
+        return state
+
+    def discard(self, monitor_id):
+        with self._lock:
+            self._states.pop(monitor_id, None)
+
+    def __len__(self):
+        return len(self._states)
+
+    def per_monitor(self, attribute):
+        """``{(monitor_id,): value}`` of one counter, for labelled metrics."""
+        return {(monitor_id,): getattr(state, attribute)
+                for monitor_id, state in list(self._states.items()) if state.full}
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class DnsCache:
+    """Size-bounded, in-process cache of host name lookups shared by all probes.
+
+    ``getaddrinfo`` does not expose record TTLs, so answers are kept for a
+    fixed ``ttl`` and failures for ``negative_ttl`` seconds. A lookup that is
+    served from an entry older than ``prefetch`` of its TTL refreshes it in
+    the background, so hot hosts never wait for the resolver. ``resolver``
+    defaults to :func:`socket.getaddrinfo` and can be swapped for a stub.
+    """
+
+    def __init__(self, ttl=60, negative_ttl=10, max_entries=4096, prefetch=0.8,
+                 resolver=socket.getaddrinfo):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.prefetch = prefetch
+        self.resolver = resolver
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._pending = {}
+        self._prefetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix='dns-prefetch')
+        self.hits = 0
+        self.misses = 0
+        self.prefetches = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _lookup(self, host, port):
+        try:
+            infos = self.resolver(host, port, type=socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            return None, e
+        return [info[4][0] for info in infos], None
+
+    def _store(self, key, addresses, error):
+        ttl = self.negative_ttl if error else self.ttl
+        with self._lock:
+            self._entries[key] = (addresses, error, time.monotonic(), ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _cached(self, key):
+        """Return a fresh entry, scheduling a prefetch when it is about to expire."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            addresses, error, stored, ttl = entry
+            age = now - stored
+            if age >= ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            refresh = (not error and self.prefetch and age >= ttl * self.prefetch
+                       and key not in self._refreshing)
+            if refresh:
+                self._refreshing.add(key)
+        if refresh:
+            self.prefetches += 1
+            self._prefetcher.submit(self._refresh, key)
+        return entry
+
+    def _refresh(self, key):
+        try:
+            addresses, error = self._lookup(*key)
+            if not error:
+                self._store(key, addresses, None)
+        except Exception:
+            logger.exception('Prefetching %s failed', key[0])
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _result(self, entry):
+        addresses, error = entry[0], entry[1]
+        if error:
+            raise socket.gaierror(error.errno, error.strerror)
+        return addresses
+
+    def resolve(self, host, port=None):
+        """Addresses for ``host``; raises :class:`socket.gaierror` for (cached) failures."""
+        key = (host, port)
+        entry = self._cached(key)
+        if entry is None:
+            self.misses += 1
+            addresses, error = self._lookup(host, port)
+            self._store(key, addresses, error)
+            entry = (addresses, error)
+        return self._result(entry)
+
+    async def resolve_async(self, host, port=None):
+        """Like :meth:`resolve`; concurrent misses for one host share a single lookup.
+
+        Only to be used from one event loop.
+        """
+        key = (host, port)
+        entry = self._cached(key)
+        if entry is not None:
+            return self._result(entry)
+        pending = self._pending.get(key)
+        if pending is None:
+            self.misses += 1
+            loop = asyncio.get_running_loop()
+            pending = self._pending[key] = loop.run_in_executor(None, self._lookup, host, port)
+
+            def done(future):
+                del self._pending[key]
+                if not future.cancelled() and future.exception() is None:
+                    self._store(key, *future.result())
+
+            pending.add_done_callback(done)
+        # A probe that times out must not cancel the lookup for the others.
+        return self._result(await asyncio.shield(pending))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def close(self):
+        self._prefetcher.shutdown(wait=False)
+
+    def stats(self):
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                'prefetches': self.prefetches}
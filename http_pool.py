@@ -0,0 +1,175 @@
+import asyncio
+import ssl
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def pool_key(url):
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    return parts.scheme, parts.hostname, port
+
+
+class SessionPool:
+    """Shared keep-alive ``requests`` sessions keyed by scheme and host.
+
+    Sessions that have not been used for ``idle_timeout`` seconds are closed
+    the next time the pool is touched. ``resolver`` is an optional
+    :class:`dns_cache.DnsCache` for checks that open their own sockets.
+    """
+
+    def __init__(self, pool_size=10, idle_timeout=90, keep_alive=True, resolver=None):
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.keep_alive = keep_alive
+        self.resolver = resolver
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._last_evict = time.monotonic()
+
+    def _new_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
+
+    def session_for(self, url):
+        key = pool_key(url)
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_evict > self.idle_timeout:
+                self._evict(now)
+            entry = self._sessions.get(key)
+            if entry is None:
+                entry = self._sessions[key] = [self._new_session(), now]
+            entry[1] = now
+            return entry[0]
+
+    def request(self, method, url, warm=True, **kwargs):
+        if not warm:
+            headers = dict(kwargs.pop('headers', None) or {}, Connection='close')
+            with requests.Session() as session:
+                return session.request(method, url, headers=headers, **kwargs)
+        return self.session_for(url).request(method, url, **kwargs)
+
+    def get(self, url, warm=True, **kwargs):
+        return self.request('GET', url, warm=warm, **kwargs)
+
+    def _evict(self, now):
+        self._last_evict = now
+        for key, (session, last_used) in list(self._sessions.items()):
+            if now - last_used > self.idle_timeout:
+                del self._sessions[key]
+                session.close()
+
+    def close(self):
+        with self._lock:
+            for session, _ in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class AsyncConnectionPool:
+    """Idle keep-alive stream connections for the asyncio probe engine.
+
+    Only used from the engine's event loop, so no locking is needed. New
+    connections look their host up through ``resolver`` (a
+    :class:`dns_cache.DnsCache`) when one is given.
+    """
+
+    def __init__(self, pool_size=10, idle_timeout=90, keep_alive=True, resolver=None):
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.keep_alive = keep_alive
+        self.resolver = resolver
+        self._idle = {}
+
+    async def resolve(self, host, port, timings=None):
+        """Addresses to try for ``host``; the lookup time goes to ``timings['dns']`` (ms)."""
+        if self.resolver is None:
+            return [host]
+        start = time.monotonic()
+        try:
+            return await self.resolver.resolve_async(host, port)
+        finally:
+            if timings is not None:
+                timings['dns'] = int((time.monotonic() - start) * 1000)
+
+    async def open_connection(self, host, port, context=None, timings=None):
+        """Connect to the first reachable address of ``host``.
+
+        TCP connect and TLS handshake times go to ``timings['connect']`` and
+        ``timings['tls']`` (ms).
+        """
+        error = None
+        for address in await self.resolve(host, port, timings):
+            start = time.monotonic()
+            try:
+                reader, writer = await asyncio.open_connection(address, port)
+            except OSError as e:
+                error = e
+                continue
+            if timings is not None:
+                timings['connect'] = int((time.monotonic() - start) * 1000)
+            if context is not None:
+                start = time.monotonic()
+                try:
+                    await writer.start_tls(context, server_hostname=host)
+                except BaseException:
+                    writer.close()
+                    raise
+                if timings is not None:
+                    timings['tls'] = int((time.monotonic() - start) * 1000)
+            return reader, writer
+        raise error
+
+    async def acquire(self, url, warm=True, timings=None):
+        key = pool_key(url)
+        if warm and self.keep_alive:
+            idle = self._idle.get(key)
+            now = time.monotonic()
+            while idle:
+                reader, writer, since = idle.pop()
+                if now - since <= self.idle_timeout and not reader.at_eof() \
+                        and not writer.is_closing():
+                    return reader, writer, True
+                writer.close()
+        scheme, host, port = key
+        context = ssl.create_default_context() if scheme == 'https' else None
+        reader, writer = await self.open_connection(host, port, context, timings)
+        return reader, writer, False
+
+    def release(self, url, reader, writer, reusable):
+        if not (reusable and self.keep_alive):
+            writer.close()
+            return
+        idle = self._idle.setdefault(pool_key(url), deque())
+        if len(idle) >= self.pool_size:
+            writer.close()
+            return
+        idle.append((reader, writer, time.monotonic()))
+
+    def evict_idle(self):
+        now = time.monotonic()
+        for key, idle in list(self._idle.items()):
+            while idle and now - idle[0][2] > self.idle_timeout:
+                idle.popleft()[1].close()
+            if not idle:
+                del self._idle[key]
+
+    def close(self):
+        for idle in self._idle.values():
+            for _, writer, _ in idle:
+                writer.close()
+        self._idle.clear()
@@ -0,0 +1,56 @@
+import collections
+import itertools
+import threading
+
+
+class ChangeFeed:
+    """Shared, bounded log of status changes for server-sent event streams.
+
+    Every change is serialized once and appended with a sequence number.
+    Clients only remember the last sequence they saw and read the log from
+    there, so fan-out to many streams costs no per-client queues or queries.
+    A client that fell further behind than ``size`` changes has to resync.
+    """
+
+    def __init__(self, size=1000):
+        self._events = collections.deque(maxlen=size)
+        self._cond = threading.Condition()
+        self.seq = 0
+        self.subscribers = 0
+
+    def publish(self, key, monitor_id, data):
+        with self._cond:
+            self.seq += 1
+            self._events.append((self.seq, key, monitor_id, data))
+            self._cond.notify_all()
+
+    def wait(self, seq, timeout):
+        """Block until there are changes after ``seq``; returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.seq != seq, timeout)
+
+    def since(self, seq):
+        """Return ``(events, last_seq)`` after ``seq``, or ``(None, last_seq)`` on a gap."""
+        with self._cond:
+            if seq > self.seq:
+                # Sequence from before a restart.
+                return None, self.seq
+            if seq == self.seq:
+                return [], seq
+            first = self._events[0][0]
+            if seq < first - 1:
+                return None, self.seq
+            events = list(itertools.islice(self._events, seq - first + 1, None))
+            return events, self.seq
+
+    def join(self, limit=None):
+        """Count a new stream; False when ``limit`` streams are already open."""
+        with self._cond:
+            if limit is not None and self.subscribers >= limit:
+                return False
+            self.subscribers += 1
+            return True
+
+    def leave(self):
+        with self._cond:
+            self.subscribers -= 1
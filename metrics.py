@@ -0,0 +1,180 @@
+"""Minimal Prometheus text-format metrics for the checker.
+
+Counters and histograms are updated from the checker's threads; gauges are
+callbacks sampled when ``/metrics`` is scraped, so they cost nothing
+between scrapes. Values are per process.
+"""
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Seconds; suits both probe phases and scheduling lag.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                     for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Incremented with :meth:`inc`, or read from ``fn`` like a :class:`Gauge`
+    when the count is already kept elsewhere."""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=(), fn=None):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.fn = fn
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels[name] for name in self.label_names), 0)
+
+    def samples(self):
+        if self.fn is not None:
+            yield from Gauge.samples(self)
+            return
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name, _labels(self.label_names, key), value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.label_names)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            if index < len(self.buckets):
+                entry[0][index] += 1
+            entry[1] += 1
+            entry[2] += value
+
+    def totals(self, **labels):
+        """``(count, sum)`` of the observations with ``labels``."""
+        entry = self._values.get(tuple(labels[name] for name in self.label_names))
+        return (entry[1], entry[2]) if entry else (0, 0.0)
+
+    def samples(self):
+        with self._lock:
+            values = [(key, list(counts), count, total)
+                      for key, (counts, count, total) in self._values.items()]
+        names = self.label_names + ('le',)
+        for key, counts, count, total in values:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                yield self.name + '_bucket', _labels(names, key + (_number(bound),)), cumulative
+            yield self.name + '_bucket', _labels(names, key + ('+Inf',)), count
+            yield self.name + '_count', _labels(self.label_names, key), count
+            yield self.name + '_sum', _labels(self.label_names, key), total
+
+
+class Gauge:
+    """Sampled from ``fn`` at scrape time.
+
+    ``fn`` returns a number, or a dict of label value tuples to numbers when
+    the gauge has ``labels``. Returning ``None`` skips the gauge.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, help, fn, labels=()):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.label_names = tuple(labels)
+
+    def samples(self):
+        value = self.fn()
+        if value is None:
+            return
+        if not self.label_names:
+            yield self.name, '', value
+            return
+        for key, v in value.items():
+            yield self.name, _labels(self.label_names, key), v
+
+
+class Registry:
+    def __init__(self, prefix=''):
+        self.prefix = prefix
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=(), fn=None):
+        return self._add(Counter(self.prefix + name, help, labels, fn))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(self.prefix + name, help, labels, buckets))
+
+    def gauge(self, name, help, fn, labels=()):
+        return self._add(Gauge(self.prefix + name, help, fn, labels))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def serve(registry, port, host='0.0.0.0'):
+    """Serve ``registry`` at ``/metrics`` on a daemon thread; for processes without Flask."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    return server
@@ -0,0 +1,186 @@
+"""Versioned schema migrations.
+
+``db.create_all()`` only creates missing tables, so every change to an
+existing table is a numbered step here. The number of applied steps is kept
+in the ``schema_version`` table. A database created from the current models
+starts at the latest version.
+"""
+from sqlalchemy import inspect, text
+
+from rollup import RESOLUTIONS, Aggregate
+from status_cache import AVAILABLE
+
+
+def _columns(conn, table):
+    return {c['name']: c for c in inspect(conn).get_columns(table)}
+
+
+def _add_column(conn, table, column_ddl):
+    if column_ddl.split()[0] not in _columns(conn, table):
+        conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column_ddl}'))
+
+
+def add_latency_mode(conn):
+    _add_column(conn, 'monitor', "latency_mode VARCHAR(10) DEFAULT 'warm'")
+
+
+def add_history_message_id(conn):
+    _add_column(conn, 'monitor_history',
+                'message_id INTEGER REFERENCES history_message (id)')
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_monitor_history_message_id '
+                      'ON monitor_history (message_id)'))
+
+
+def history_epoch_timestamp(conn):
+    column = _columns(conn, 'monitor_history')['timestamp']
+    if 'INT' in str(column['type']).upper():
+        return
+    if conn.dialect.name != 'sqlite':
+        conn.execute(text(
+            'ALTER TABLE monitor_history ALTER COLUMN timestamp TYPE INTEGER '
+            'USING CAST(EXTRACT(EPOCH FROM timestamp) AS INTEGER)'))
+        conn.execute(text('ALTER TABLE monitor_history ALTER COLUMN timestamp SET NOT NULL'))
+        return
+    # SQLite cannot change a column type in place, so rebuild the table.
+    conn.execute(text('DROP INDEX IF EXISTS ix_monitor_history_message_id'))
+    conn.execute(text('''
+        CREATE TABLE monitor_history_new (
+            id INTEGER NOT NULL PRIMARY KEY,
+            monitor_id INTEGER NOT NULL REFERENCES monitor (id),
+            timestamp INTEGER NOT NULL,
+            status VARCHAR(20),
+            response_time INTEGER,
+            message VARCHAR(255),
+            message_id INTEGER REFERENCES history_message (id)
+        )'''))
+    conn.execute(text('''
+        INSERT INTO monitor_history_new
+            (id, monitor_id, timestamp, status, response_time, message, message_id)
+        SELECT id, monitor_id, COALESCE(CAST(strftime('%s', timestamp) AS INTEGER), 0),
+               status, response_time, message, message_id
+        FROM monitor_history'''))
+    conn.execute(text('DROP TABLE monitor_history'))
+    conn.execute(text('ALTER TABLE monitor_history_new RENAME TO monitor_history'))
+    conn.execute(text('CREATE INDEX ix_monitor_history_message_id ON monitor_history (message_id)'))
+
+
+def add_lookup_indexes(conn):
+    for ddl in (
+        'CREATE INDEX IF NOT EXISTS ix_monitor_user_id ON monitor (user_id)',
+        'CREATE INDEX IF NOT EXISTS ix_monitor_history_monitor_ts '
+        'ON monitor_history (monitor_id, timestamp)',
+        'CREATE INDEX IF NOT EXISTS ix_monitor_history_timestamp ON monitor_history (timestamp)',
+        'CREATE INDEX IF NOT EXISTS ix_monitor_rollup_width_bucket '
+        'ON monitor_rollup (width, bucket)',
+    ):
+        conn.execute(text(ddl))
+
+
+def add_retry_settings(conn):
+    _add_column(conn, 'monitor', 'retries INTEGER DEFAULT 0')
+    _add_column(conn, 'monitor', 'retry_interval INTEGER DEFAULT 60')
+
+
+def add_last_checked_index(conn):
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_monitor_last_checked '
+                      'ON monitor (last_checked)'))
+
+
+def add_probe_settings(conn):
+    _add_column(conn, 'monitor', "type VARCHAR(10) DEFAULT 'http'")
+    _add_column(conn, 'monitor', "http_method VARCHAR(10) DEFAULT 'GET'")
+    _add_column(conn, 'monitor', 'keyword VARCHAR(255)')
+    _add_column(conn, 'monitor', 'accepted_statuses VARCHAR(100)')
+
+
+def add_history_dns_time(conn):
+    _add_column(conn, 'monitor_history', 'dns_time INTEGER')
+
+
+def add_history_phases(conn):
+    _add_column(conn, 'monitor_history', 'connect_time INTEGER')
+    _add_column(conn, 'monitor_history', 'tls_time INTEGER')
+    _add_column(conn, 'monitor_history', 'ttfb INTEGER')
+    _add_column(conn, 'monitor_history', 'transfer_time INTEGER')
+    _add_column(conn, 'monitor_history', 'body_bytes INTEGER')
+
+
+def cascade_monitor_deletes(conn):
+    # SQLite does not enforce foreign keys; the retention job cleans up there.
+    if conn.dialect.name != 'postgresql':
+        return
+    for table in ('monitor_history', 'monitor_rollup'):
+        for fk in inspect(conn).get_foreign_keys(table):
+            if fk['referred_table'] != 'monitor' or fk['constrained_columns'] != ['monitor_id']:
+                continue
+            if fk.get('options', {}).get('ondelete', '').upper() == 'CASCADE':
+                break
+            conn.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT {fk["name"]}'))
+            conn.execute(text(f'ALTER TABLE {table} ADD CONSTRAINT {fk["name"]} '
+                              'FOREIGN KEY (monitor_id) REFERENCES monitor (id) ON DELETE CASCADE'))
+
+
+def populate_rollups(conn):
+    # Databases from before rollups have raw history but no rollup rows, and
+    # the uptime and latency cards read only rollups.
+    if conn.execute(text('SELECT 1 FROM monitor_rollup LIMIT 1')).first() is not None:
+        return
+    columns = ['monitor_id', 'width', 'bucket'] + list(Aggregate().as_row())
+    insert = text(f'INSERT INTO monitor_rollup ({", ".join(columns)}) '
+                  f'VALUES ({", ".join(":" + c for c in columns)})')
+
+    def write(monitor_id, aggregates):
+        rows = [dict(agg.as_row(), monitor_id=monitor_id, width=width, bucket=bucket)
+                for (width, bucket), agg in aggregates.items()]
+        if rows:
+            conn.execute(insert, rows)
+
+    current, aggregates = None, {}
+    rows = conn.execution_options(yield_per=1000).execute(text(
+        'SELECT monitor_id, timestamp, status, response_time FROM monitor_history '
+        'ORDER BY monitor_id, timestamp'))
+    for monitor_id, checked_at, status, response_time in rows:
+        if monitor_id != current:
+            write(current, aggregates)
+            current, aggregates = monitor_id, {}
+        for width in RESOLUTIONS:
+            agg = aggregates.get((width, checked_at // width))
+            if agg is None:
+                agg = aggregates[(width, checked_at // width)] = Aggregate()
+            agg.add(status in AVAILABLE, response_time if status == 'up' else None)
+    write(current, aggregates)
+
+
+MIGRATIONS = [
+    add_latency_mode,
+    add_history_message_id,
+    history_epoch_timestamp,
+    add_lookup_indexes,
+    add_retry_settings,
+    add_last_checked_index,
+    add_probe_settings,
+    add_history_dns_time,
+    add_history_phases,
+    cascade_monitor_deletes,
+    populate_rollups,
+]
+
+
+def current_version(conn):
+    conn.execute(text('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)'))
+    version = conn.execute(text('SELECT version FROM schema_version')).scalar()
+    if version is None:
+        conn.execute(text('INSERT INTO schema_version (version) VALUES (0)'))
+        return 0
+    return version
+
+
+def migrate(engine, fresh=False):
+    """Apply pending migrations; a ``fresh`` database is simply stamped as current."""
+    with engine.begin() as conn:
+        version = current_version(conn)
+        pending = [] if fresh else MIGRATIONS[version:]
+        for step in pending:
+            step(conn)
+        conn.execute(text('UPDATE schema_version SET version = :v'), {'v': len(MIGRATIONS)})
+        return len(pending)
@@ -0,0 +1,219 @@
+"""Streaming CSV / JSON readers and writers for bulk monitor import and export.
+
+Readers yield ``(row_number, dict)`` one record at a time and writers yield
+text chunks, so neither side ever holds a whole file in memory.
+"""
+import codecs
+import csv
+import io
+import json
+import re
+
+import probes
+
+FIELDS = ('name', 'type', 'url', 'interval', 'retries', 'retry_interval', 'latency_mode',
+          'http_method', 'keyword', 'accepted_statuses')
+MIN_INTERVAL = 10
+MAX_INTERVAL = 86400
+MAX_RETRIES = 10
+LATENCY_MODES = ('warm', 'cold')
+CHUNK_SIZE = 64 * 1024
+# What a number cut off at the end of the buffer may still continue with.
+NUMBER_TAIL = re.compile(r'[0-9.eE+-]*\Z')
+INTEGER = re.compile(r'\s*[+-]?\d{1,12}\s*')
+
+
+def _str(row, field):
+    value = row.get(field)
+    if value is None:
+        return ''
+    if not isinstance(value, str):
+        raise ValueError(f'{field} must be a string')
+    return value
+
+
+def _int(row, field, default, low, high):
+    value = row.get(field)
+    if value is None or value == '':
+        return default
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    elif isinstance(value, str) and INTEGER.fullmatch(value):
+        value = int(value)
+    elif not isinstance(value, int) or isinstance(value, bool):
+        raise ValueError(f'{field} must be an integer')
+    if not low <= value <= high:
+        raise ValueError(f'{field} must be between {low} and {high}')
+    return value
+
+
+def validate(row):
+    """Return the monitor columns for one import row or raise ValueError."""
+    if not isinstance(row, dict):
+        raise ValueError('row must be an object')
+    name = _str(row, 'name').strip()
+    if not name:
+        raise ValueError('name is required')
+    if len(name) > 100:
+        raise ValueError('name is longer than 100 characters')
+    probe_type = _str(row, 'type') or 'http'
+    url = probes.normalize_url(probe_type, _str(row, 'url'))
+    if len(url) > 255:
+        raise ValueError('url is longer than 255 characters')
+    interval = _int(row, 'interval', 60, MIN_INTERVAL, MAX_INTERVAL)
+    retries = _int(row, 'retries', 0, 0, MAX_RETRIES)
+    retry_interval = _int(row, 'retry_interval', interval, MIN_INTERVAL, MAX_INTERVAL)
+    latency_mode = _str(row, 'latency_mode') or 'warm'
+    if latency_mode not in LATENCY_MODES:
+        raise ValueError(f'latency_mode must be one of {", ".join(LATENCY_MODES)}')
+    http_method = (_str(row, 'http_method') or 'GET').upper()
+    if http_method not in probes.HTTP_METHODS:
+        raise ValueError(f'http_method must be one of {", ".join(probes.HTTP_METHODS)}')
+    keyword = _str(row, 'keyword') or None
+    if keyword and len(keyword) > 255:
+        raise ValueError('keyword is longer than 255 characters')
+    accepted_statuses = _str(row, 'accepted_statuses').replace(' ', '') or None
+    if accepted_statuses and len(accepted_statuses) > 100:
+        raise ValueError('accepted_statuses is longer than 100 characters')
+    probes.parse_statuses(accepted_statuses)
+    return {'name': name, 'type': probe_type, 'url': url, 'interval': interval,
+            'retries': retries, 'retry_interval': retry_interval,
+            'latency_mode': latency_mode, 'http_method': http_method, 'keyword': keyword,
+            'accepted_statuses': accepted_statuses}
+
+
+def read_csv(stream):
+    """Rows of a CSV file with a header line; numbered like the file's lines."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(text)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_json_lines(stream):
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    for number, line in enumerate(stream, 1):
+        line = decoder.decode(line).strip()
+        if not line:
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as e:
+            yield number, ValueError(f'invalid JSON: {e}')
+
+
+def read_json(stream):
+    """Elements of a top-level JSON array, decoded incrementally.
+
+    Rows are numbered by their position in the array. A syntax error ends
+    the import with a ValueError row, since nothing after it can be trusted.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8-sig')()
+    buf = ''
+    pos = 0
+    eof = False
+    state = 'start'
+    number = 0
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = stream.read(CHUNK_SIZE)
+        buf = buf[pos:] + text.decode(chunk, final=not chunk)
+        pos = 0
+        eof = not chunk
+
+    def skip_space():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos].isspace():
+                pos += 1
+            if pos < len(buf) or eof:
+                return
+            fill()
+
+    while True:
+        skip_space()
+        if pos >= len(buf):
+            if state == 'start':
+                yield number + 1, ValueError('expected a JSON array')
+            elif state != 'done':
+                yield number + 1, ValueError('unterminated JSON array')
+            return
+        char = buf[pos]
+        if state == 'start':
+            if char != '[':
+                yield number + 1, ValueError('expected a JSON array')
+                return
+            pos += 1
+            state = 'first'
+            continue
+        if state == 'done':
+            yield number + 1, ValueError('unexpected data after the JSON array')
+            return
+        if char == ']':
+            pos += 1
+            state = 'done'
+            continue
+        if state == 'more':
+            if char != ',':
+                yield number + 1, ValueError(f'expected "," after element {number}')
+                return
+            pos += 1
+            skip_space()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except ValueError as e:
+                if eof:
+                    yield number + 1, ValueError(f'invalid JSON: {e}')
+                    return
+                fill()
+                continue
+            if not eof and not isinstance(value, (dict, list, str)) \
+                    and NUMBER_TAIL.match(buf, end):
+                # A number may continue in the next chunk: "-0." decodes as
+                # -0 until the digits after the point arrive.
+                fill()
+                continue
+            break
+        pos = end
+        number += 1
+        state = 'more'
+        yield number, value
+
+
+READERS = {'csv': read_csv, 'json': read_json, 'jsonl': read_json_lines}
+
+
+def write_csv(rows):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(FIELDS)
+    for row in rows:
+        writer.writerow([row[field] for field in FIELDS])
+        if out.tell() >= CHUNK_SIZE:
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+    yield out.getvalue()
+
+
+def write_json(rows):
+    separator = '[\n'
+    for row in rows:
+        yield separator + json.dumps({field: row[field] for field in FIELDS})
+        separator = ',\n'
+    yield '[]\n' if separator == '[\n' else '\n]\n'
+
+
+def write_json_lines(rows):
+    for row in rows:
+        yield json.dumps({field: row[field] for field in FIELDS}) + '\n'
+
+
+WRITERS = {
+    'csv': (write_csv, 'text/csv'),
+    'json': (write_json, 'application/json'),
+    'jsonl': (write_json_lines, 'application/x-ndjson'),
+}
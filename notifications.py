@@ -0,0 +1,289 @@
+"""Coalesced status change notifications.
+
+Transitions are collected for ``window`` seconds and sent as one grouped
+notification, so an upstream outage that takes hundreds of monitors down
+at once produces a single message. A monitor that flips and flips back
+within the window cancels out. Each channel has its own bounded outbox,
+sender thread, rate limit and retry with exponential backoff; whatever
+piles up while a channel waits is merged into its next message.
+"""
+import json
+import logging
+import threading
+import time
+from collections import deque, namedtuple
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+Transition = namedtuple('Transition', 'monitor_id old new message at')
+
+
+class DeliveryError(Exception):
+    def __init__(self, message, retryable=True, retry_after=None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class WebhookChannel:
+    """POSTs each notification as JSON to ``url``."""
+
+    def __init__(self, url, timeout=10):
+        self.name = url
+        self.url = url
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def send(self, payload):
+        """Deliver ``payload`` or raise; 429 and 5xx answers are worth retrying."""
+        response = self._session.post(self.url, data=json.dumps(payload), timeout=self.timeout,
+                                      headers={'Content-Type': 'application/json'})
+        code = response.status_code
+        if code >= 400:
+            retry_after = response.headers.get('Retry-After', '')
+            raise DeliveryError(f'{self.url} answered {code}', code == 429 or code >= 500,
+                                float(retry_after) if retry_after.isdigit() else None)
+
+    def close(self):
+        self._session.close()
+
+
+def summary(changes):
+    down = sum(1 for c in changes if c['status'] == 'down')
+    up = len(changes) - down
+    parts = []
+    if down:
+        parts.append(f'{down} monitor{"s" if down != 1 else ""} down')
+    if up:
+        parts.append(f'{up} monitor{"s" if up != 1 else ""} up')
+    text = ', '.join(parts)
+    if len(changes) == 1:
+        change = changes[0]
+        text = f'{change["name"]} is {change["status"]}'
+        if change.get('message'):
+            text += f': {change["message"]}'
+    return text
+
+
+class Outbox:
+    """Sends one channel's notifications from a bounded queue on its own thread.
+
+    At most ``rate`` messages go out per ``per`` seconds. Queued
+    notifications are merged into a single message when sent; when more than
+    ``max_queue`` are waiting the oldest are dropped. Failed sends are
+    retried ``retries`` times, ``backoff`` seconds apart at first and twice
+    as long after each attempt.
+    """
+
+    def __init__(self, channel, rate=6, per=60, max_queue=100, retries=5, backoff=2.0):
+        self.channel = channel
+        self.rate = rate
+        self.per = per
+        self.retries = retries
+        self.backoff = backoff
+        self._queue = deque(maxlen=max_queue)
+        self._cond = threading.Condition()
+        self._tokens = float(rate)
+        self._refilled = time.monotonic()
+        self._stopping = False
+        self._thread = None
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def start(self):
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='notify-outbox', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        if self._thread is None:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def put(self, changes):
+        with self._cond:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += len(self._queue[0])
+            self._queue.append(changes)
+            self._cond.notify()
+
+    def __len__(self):
+        return len(self._queue)
+
+    def _wait_for_token(self):
+        """Block until the rate limit allows a message; on stop one last may go out."""
+        while not self._stopping:
+            now = time.monotonic()
+            refill = (now - self._refilled) * self.rate / self.per
+            self._tokens = min(self.rate, self._tokens + refill)
+            self._refilled = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            self._cond.wait((1 - self._tokens) * self.per / self.rate)
+
+    def _take(self):
+        with self._cond:
+            while not self._queue and not self._stopping:
+                self._cond.wait()
+            if not self._queue:
+                return None
+            self._wait_for_token()
+            changes = [change for batch in self._queue for change in batch]
+            self._queue.clear()
+            return changes
+
+    def _run(self):
+        while True:
+            changes = self._take()
+            if changes is None:
+                return
+            self._deliver({'text': summary(changes), 'changes': changes})
+
+    def _sleep(self, seconds):
+        """Wait out a backoff; False when stopping. New messages do not cut it short."""
+        deadline = time.monotonic() + seconds
+        with self._cond:
+            while not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return True
+                self._cond.wait(remaining)
+        return False
+
+    def _deliver(self, payload):
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            try:
+                self.channel.send(payload)
+                self.sent += 1
+                return
+            except (requests.RequestException, DeliveryError) as e:
+                if attempt == self.retries or not getattr(e, 'retryable', True):
+                    logger.warning('Notification to %s failed: %s', self.channel.name, e)
+                    break
+                wait = getattr(e, 'retry_after', None) or delay
+                logger.warning('Notification to %s failed (%s); retrying in %.0fs',
+                               self.channel.name, e, wait)
+                if not self._sleep(wait):
+                    break
+                delay *= 2
+        self.failed += 1
+        logger.error('Dropping notification of %d changes to %s', len(payload['changes']),
+                     self.channel.name)
+
+
+class Notifier:
+    """Batches transitions and hands grouped notifications to every channel.
+
+    ``describe(monitor_ids)`` returns ``{id: {'name': ..., 'url': ...}}`` for
+    the monitors in a batch; monitors it does not know (deleted meanwhile)
+    are left out.
+    """
+
+    def __init__(self, channels, describe, window=5.0, **outbox_options):
+        self.describe = describe
+        self.window = window
+        self.outboxes = [Outbox(channel, **outbox_options) for channel in channels]
+        self._pending = {}
+        self._first_at = None
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread = None
+        self.transitions = 0
+        self.batches = 0
+
+    def start(self):
+        if self._thread is not None or not self.outboxes:
+            return
+        self._stopping = False
+        for outbox in self.outboxes:
+            outbox.start()
+        self._thread = threading.Thread(target=self._run, name='notifier', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        if self._thread is None:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        self._thread = None
+        for outbox in self.outboxes:
+            outbox.stop(timeout)
+
+    def add(self, transition):
+        if not self.outboxes:
+            return
+        with self._cond:
+            self.transitions += 1
+            earlier = self._pending.get(transition.monitor_id)
+            if earlier is not None:
+                if earlier.old == transition.new:
+                    # Flipped back within the window: nothing to report.
+                    del self._pending[transition.monitor_id]
+                    return
+                transition = transition._replace(old=earlier.old)
+            if not self._pending:
+                self._first_at = time.monotonic()
+                self._cond.notify()
+            self._pending[transition.monitor_id] = transition
+
+    def _take(self):
+        with self._cond:
+            while not self._stopping:
+                if self._pending:
+                    remaining = self._first_at + self.window - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                else:
+                    self._cond.wait()
+            batch, self._pending = self._pending, {}
+            return list(batch.values())
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            if batch:
+                try:
+                    self._publish(batch)
+                except Exception:
+                    logger.exception('Publishing %d status changes failed', len(batch))
+            if self._stopping:
+                return
+
+    def _publish(self, batch):
+        info = self.describe([t.monitor_id for t in batch])
+        changes = []
+        for t in sorted(batch, key=lambda t: t.at):
+            monitor = info.get(t.monitor_id)
+            if monitor is None:
+                continue
+            changes.append(dict(monitor, id=t.monitor_id, previous=t.old, status=t.new,
+                                message=t.message,
+                                at=time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(t.at))))
+        if not changes:
+            return
+        self.batches += 1
+        for outbox in self.outboxes:
+            outbox.put(changes)
+
+    def stats(self):
+        return {
+            'transitions': self.transitions,
+            'batches': self.batches,
+            'pending': len(self._pending),
+            'queued': sum(len(o) for o in self.outboxes),
+            'sent': sum(o.sent for o in self.outboxes),
+            'failed': sum(o.failed for o in self.outboxes),
+            'dropped': sum(o.dropped for o in self.outboxes),
+        }
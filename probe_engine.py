@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from http_pool import AsyncConnectionPool
+from probes import ProbeError, run_probe
+
+logger = logging.getLogger(__name__)
+
+
+class CheckResult:
+    """Outcome of one check. ``timings`` holds per-phase durations in ms,
+    e.g. ``{'dns': 3}``; ``response_time`` excludes the DNS lookup."""
+
+    __slots__ = ('monitor_id', 'status', 'response_time', 'message', 'checked_at', 'timings')
+
+    def __init__(self, monitor_id, status, response_time, message, checked_at=None,
+                 timings=None):
+        self.monitor_id = monitor_id
+        self.status = status
+        self.response_time = response_time
+        self.message = message
+        self.checked_at = checked_at or datetime.utcnow()
+        self.timings = timings or {}
+
+
+class ProbeEngine:
+    """Runs checks on a single asyncio event loop.
+
+    Checks are submitted from any thread. A global semaphore bounds the number
+    of probes in flight and a per-host semaphore keeps one slow host from
+    taking every slot. Results are handed to ``on_result`` on a small worker
+    pool so persistence never blocks the loop.
+    """
+
+    def __init__(self, on_result, concurrency=500, per_host=10, result_workers=2,
+                 pool=None, max_body=65536, responses=None):
+        self.on_result = on_result
+        self.max_body = max_body
+        # conditional.ResponseStore for revalidating HTTP checks, if any.
+        self.responses = responses
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.pool = pool or AsyncConnectionPool(pool_size=per_host)
+        self.loop = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._semaphore = None
+        self._host_semaphores = weakref.WeakValueDictionary()
+        self._inflight = set()
+        self._lock = threading.Lock()
+        self._results = ThreadPoolExecutor(max_workers=result_workers,
+                                           thread_name_prefix='probe-result')
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run_loop, name='probe-engine', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def stop(self, timeout=5):
+        if self.loop is None:
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+        self._results.shutdown(wait=True)
+        self._thread = None
+        self.loop = None
+
+    def _run_loop(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self.loop.call_later(self.pool.idle_timeout, self._evict_idle)
+        self._ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.pool.close()
+            pending = asyncio.all_tasks(self.loop)
+            for task in pending:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self.loop.close()
+
+    def _evict_idle(self):
+        self.pool.evict_idle()
+        self.loop.call_later(self.pool.idle_timeout, self._evict_idle)
+
+    @property
+    def inflight(self):
+        return len(self._inflight)
+
+    def submit(self, monitor_id, spec, timeout):
+        """Queue a check of :class:`probes.ProbeSpec` ``spec`` unless one is running."""
+        with self._lock:
+            if monitor_id in self._inflight:
+                return False
+            self._inflight.add(monitor_id)
+        asyncio.run_coroutine_threadsafe(self._check(monitor_id, spec, timeout), self.loop)
+        return True
+
+    def _host_semaphore(self, url):
+        host = urlsplit(url).netloc
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.per_host)
+            self._host_semaphores[host] = semaphore
+        return semaphore
+
+    async def _check(self, monitor_id, spec, timeout):
+        try:
+            host_semaphore = self._host_semaphore(spec.url)
+            async with self._semaphore, host_semaphore:
+                result = await self._probe(monitor_id, spec, timeout)
+        finally:
+            with self._lock:
+                self._inflight.discard(monitor_id)
+        self._results.submit(self.on_result, result)
+
+    async def _probe(self, monitor_id, spec, timeout):
+        # Like requests, ``timeout`` is either a total or a (connect, read) pair.
+        connect_timeout = read_timeout = None
+        if isinstance(timeout, tuple):
+            (connect_timeout, read_timeout), timeout = timeout, None
+        timings = {}
+        state = None
+        if self.responses is not None and spec.type == 'http':
+            state = self.responses.get(monitor_id)
+        start_time = time.monotonic()
+        try:
+            up, message = await asyncio.wait_for(
+                run_probe(spec, self.pool, connect_timeout, read_timeout, self.max_body, timings,
+                          state),
+                timeout)
+        except asyncio.TimeoutError as e:
+            message = f'Timed out after {timeout}s' if timeout is not None else str(e)
+            return CheckResult(monitor_id, 'down', None, message or 'Timed out', timings=timings)
+        except (OSError, ValueError, asyncio.IncompleteReadError, ProbeError) as e:
+            return CheckResult(monitor_id, 'down', None, str(e) or e.__class__.__name__,
+                               timings=timings)
+        except Exception as e:
+            # A bug in a probe must not cost the monitor its result.
+            logger.exception('Check of monitor %s failed', monitor_id)
+            return CheckResult(monitor_id, 'down', None, str(e) or e.__class__.__name__,
+                               timings=timings)
+        response_time = int((time.monotonic() - start_time) * 1000) - timings.get('dns', 0)
+        return CheckResult(monitor_id, 'up' if up else 'down', response_time, message,
+                           timings=timings)
@@ -0,0 +1,62 @@
+import collections
+import math
+import threading
+
+
+class ProbePolicy:
+    """Per-monitor connect and read timeouts adapted to recent latency.
+
+    The read timeout is a multiple of a high percentile of the monitor's
+    last ``window`` successful response times, clamped to
+    ``[min_read_timeout, max_read_timeout]``. Until ``min_samples`` responses
+    are known the maximum is used, so a new or slow endpoint is not marked
+    down for being slower than some default.
+    """
+
+    def __init__(self, connect_timeout=5.0, min_read_timeout=2.0, max_read_timeout=30.0,
+                 multiplier=3.0, quantile=0.99, window=50, min_samples=10):
+        self.connect_timeout = connect_timeout
+        self.min_read_timeout = min_read_timeout
+        self.max_read_timeout = max_read_timeout
+        self.multiplier = multiplier
+        self.quantile = quantile
+        self.window = window
+        self.min_samples = min_samples
+        self._latencies = {}
+        self._lock = threading.Lock()
+
+    def observe(self, monitor_id, latency):
+        """Record the response time (ms) of a successful check."""
+        if latency is None:
+            return
+        samples = self._latencies.get(monitor_id)
+        if samples is None:
+            with self._lock:
+                samples = self._latencies.setdefault(
+                    monitor_id, collections.deque(maxlen=self.window))
+        samples.append(latency)
+
+    def percentile(self, monitor_id, q=None):
+        samples = sorted(self._latencies.get(monitor_id, ()))
+        if not samples:
+            return None
+        rank = math.ceil((self.quantile if q is None else q) * len(samples))
+        return samples[max(rank, 1) - 1]
+
+    def timeouts(self, monitor_id, interval):
+        """Return ``(connect, read)`` timeouts in seconds for the next check.
+
+        Both together stay below the check interval, so a hanging probe never
+        overlaps the next one.
+        """
+        read = self.max_read_timeout
+        if len(self._latencies.get(monitor_id, ())) >= self.min_samples:
+            read = self.percentile(monitor_id) * self.multiplier / 1000
+        budget = interval * 0.8
+        connect = min(self.connect_timeout, budget / 2)
+        read = min(max(read, self.min_read_timeout), self.max_read_timeout, budget - connect)
+        return connect, read
+
+    def discard(self, monitor_id):
+        with self._lock:
+            self._latencies.pop(monitor_id, None)
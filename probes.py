@@ -0,0 +1,454 @@
+"""Check implementations for each monitor type.
+
+Every probe comes in an asyncio flavour for the probe engine and a blocking
+one for the thread engine. Both return ``(up, message)`` and raise on
+network errors; the caller measures the response time.
+
+Probes also fill in the ``timings`` dict they are given with whatever
+phases of :data:`PHASES` they can see: milliseconds for ``dns`` (only when
+the host went through the pool's DNS cache), ``connect`` and ``tls`` (only
+for new connections), ``ttfb`` (request sent until the response headers are
+in) and ``transfer`` (body), and the number of body ``bytes`` read. DNS
+monitors always ask the system resolver.
+
+HTTP probes never download more than ``max_body`` bytes: HEAD reads no body
+at all and GET stops after the first ``max_body`` bytes, which is also all
+a keyword assertion looks at. Given a :class:`conditional.ResponseState`,
+GET probes revalidate the last response instead of fetching it again and
+only run the keyword assertion when the body's fingerprint changed.
+
+HTTP probes follow up to ``spec.redirects`` redirects and judge the final
+response; with 0 the redirect response itself is the result. Timings add
+up over all hops, and so does time: all hops together get the connect plus
+read timeout, so a redirect chain cannot run into the next check.
+"""
+import asyncio
+import itertools
+import socket
+import time
+from collections import namedtuple
+from urllib.parse import urljoin, urlsplit
+
+from conditional import fingerprint
+
+PROBE_TYPES = ('http', 'tcp', 'ping', 'dns')
+HTTP_METHODS = ('GET', 'HEAD')
+# 'ping' is a TCP handshake, so it needs no raw sockets; port 80 unless given.
+PING_PORT = 80
+
+PHASES = ('dns', 'connect', 'tls', 'ttfb', 'transfer', 'bytes')
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+ProbeSpec = namedtuple('ProbeSpec', 'type url interval warm method keyword accepted redirects')
+
+
+class ProbeError(Exception):
+    pass
+
+
+def normalize_url(probe_type, url):
+    """Return the URL to store for a monitor of ``probe_type`` or raise ValueError."""
+    url = url.strip()
+    if probe_type not in PROBE_TYPES:
+        raise ValueError(f'type must be one of {", ".join(PROBE_TYPES)}')
+    if probe_type == 'http':
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.netloc:
+            raise ValueError('url must be an http(s) URL')
+        return url
+    if '://' not in url:
+        url = f'{probe_type}://{url}'
+    parts = urlsplit(url)
+    if parts.scheme != probe_type or not parts.hostname:
+        raise ValueError(f'url must be a host name or {probe_type}://host')
+    try:
+        port = parts.port
+    except ValueError:
+        raise ValueError('invalid port') from None
+    if probe_type == 'tcp' and port is None:
+        raise ValueError('tcp monitors need a port, e.g. tcp://host:22')
+    return url
+
+
+def parse_statuses(text):
+    """Parse accepted status codes like ``200-299,301`` into ``((lo, hi), ...)``."""
+    ranges = []
+    for part in (text or '').replace(' ', '').split(','):
+        if not part:
+            continue
+        lo, _, hi = part.partition('-')
+        try:
+            ranges.append((int(lo), int(hi or lo)))
+        except ValueError:
+            raise ValueError(f'invalid status code range {part!r}') from None
+    return tuple(ranges)
+
+
+def status_ok(code, accepted):
+    if not accepted:
+        return code < 400
+    return any(lo <= code <= hi for lo, hi in accepted)
+
+
+def address(spec):
+    parts = urlsplit(spec.url)
+    return parts.hostname, parts.port or PING_PORT
+
+
+def _conditional_headers(spec, state):
+    """Revalidation headers, when the remembered response can answer the check."""
+    if state is None or state.fingerprint is None or _method(spec) != 'GET':
+        return {}
+    if spec.keyword and spec.keyword not in state.assertions:
+        return {}
+    return state.request_headers()
+
+
+def _http_result(spec, code, reason, body, state=None, headers=None, digest=None,
+                 timings=None):
+    """``(up, message)`` for a response; ``state`` remembers full 200 responses."""
+    message = f'{code} - {reason}'
+    found = None
+    if state is not None and code == 200:
+        if spec.keyword:
+            found = state.cached_assertion(spec.keyword, digest)
+        state.store(code, reason, headers, digest, timings.get('bytes', 0),
+                    timings.get('transfer', 0))
+    if not status_ok(code, spec.accepted):
+        return False, message
+    if spec.keyword:
+        if found is None:
+            found = spec.keyword.encode() in body
+            if state is not None and code == 200:
+                state.assertions[spec.keyword] = found
+        if not found:
+            return False, f'{message}, keyword {spec.keyword!r} not found'
+    return True, message
+
+
+def _not_modified(spec, state, reason):
+    """A 304 to a revalidation is up, with the remembered assertion result."""
+    state.record_not_modified()
+    message = f'304 - {reason}'
+    if spec.keyword and not state.assertions[spec.keyword]:
+        return False, f'{message}, keyword {spec.keyword!r} not found'
+    return True, message
+
+
+def _redirect_target(spec, url, code, headers, hops):
+    """The URL a redirect points to, or None when the response is the final one."""
+    if code not in REDIRECT_CODES or not spec.redirects or not headers.get('location'):
+        return None
+    if hops >= spec.redirects:
+        raise ProbeError(f'Too many redirects (more than {spec.redirects})')
+    return urljoin(url, headers['location'])
+
+
+def _budget(connect_timeout, read_timeout):
+    """Seconds a check may spend over all its redirect hops, or None."""
+    if connect_timeout is None or read_timeout is None:
+        return None
+    return connect_timeout + read_timeout
+
+
+def _time_left(deadline, budget, hops, now):
+    remaining = deadline - now
+    if remaining <= 0:
+        raise ProbeError(f'Timed out after {budget:g}s and {hops} redirects')
+    return remaining
+
+
+def _add_timings(timings, hop):
+    for name, value in hop.items():
+        timings[name] = timings.get(name, 0) + value
+
+
+def _method(spec):
+    # A keyword needs a body to search.
+    return 'HEAD' if spec.method == 'HEAD' and not spec.keyword else 'GET'
+
+
+# asyncio probes
+
+def _request_target(parts):
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    return path
+
+
+async def _read_head(reader):
+    line = await reader.readline()
+    if not line:
+        raise ProbeError('Connection closed without response')
+    try:
+        _, code, *reason = line.decode('latin-1').rstrip('\r\n').split(' ', 2)
+        code = int(code)
+    except ValueError:
+        raise ProbeError(f'Malformed status line: {line[:64]!r}')
+    headers = {}
+    while True:
+        header = await reader.readline()
+        if header in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = header.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return code, reason[0] if reason else '', headers
+
+
+async def _read_body(reader, method, code, headers, limit=None):
+    """Read at most ``limit`` bytes of the body; returns ``(body, reusable)``.
+
+    A connection is only reusable when the whole body was consumed.
+    """
+    keep_alive = headers.get('connection', '').lower() != 'close'
+    if method == 'HEAD' or code in (204, 304) or 100 <= code < 200:
+        return b'', keep_alive
+    body = bytearray()
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        while True:
+            size = int((await reader.readline()).split(b';', 1)[0], 16)
+            if size == 0:
+                break
+            if limit is not None and len(body) + size > limit:
+                body += await reader.readexactly(limit - len(body))
+                return bytes(body), False
+            body += (await reader.readexactly(size + 2))[:-2]
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+    elif 'content-length' in headers:
+        length = int(headers['content-length'])
+        if limit is not None and length > limit:
+            return await reader.readexactly(limit), False
+        body += await reader.readexactly(length)
+    else:
+        while limit is None or len(body) < limit:
+            data = await reader.read(65536 if limit is None else min(65536, limit - len(body)))
+            if not data:
+                break
+            body += data
+        return bytes(body), False
+    return bytes(body), keep_alive
+
+
+async def _exchange(reader, writer, request, method, keep_alive, limit, timings):
+    start = time.monotonic()
+    writer.write(request)
+    await writer.drain()
+    code, reason, headers = await _read_head(reader)
+    timings['ttfb'] = int((time.monotonic() - start) * 1000)
+    start = time.monotonic()
+    body, reusable = await _read_body(reader, method, code, headers, limit)
+    timings['transfer'] = int((time.monotonic() - start) * 1000)
+    timings['bytes'] = len(body)
+    return code, reason, headers, body, reusable and keep_alive
+
+
+async def http_request(url, pool, method='GET', warm=True, connect_timeout=None,
+                       read_timeout=None, limit=None, timings=None, headers=None):
+    """Send one request and return ``(code, reason, headers, body)``.
+
+    ``connect_timeout`` bounds opening the connection and ``read_timeout``
+    bounds sending the request and reading the response. At most ``limit``
+    bytes of the body are read. Response header names are lower-case.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ProbeError(f'Invalid URL {url!r}')
+    timings = {} if timings is None else timings
+    keep_alive = warm and pool.keep_alive
+    request = (
+        f'{method} {_request_target(parts)} HTTP/1.1\r\n'
+        f'Host: {parts.netloc.rpartition("@")[2]}\r\n'
+        'User-Agent: uptime-monitor\r\n'
+        'Accept: */*\r\n'
+        + ''.join(f'{name}: {value}\r\n' for name, value in (headers or {}).items())
+        + f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'
+    ).encode('latin-1')
+    while True:
+        try:
+            reader, writer, reused = await asyncio.wait_for(pool.acquire(url, warm, timings),
+                                                            connect_timeout)
+        except asyncio.TimeoutError:
+            raise ProbeError(f'Connect timed out after {connect_timeout:g}s') from None
+        reusable = False
+        try:
+            code, reason, response_headers, body, reusable = await asyncio.wait_for(
+                _exchange(reader, writer, request, method, keep_alive, limit, timings),
+                read_timeout)
+            return code, reason, response_headers, body
+        except (ProbeError, ConnectionError, asyncio.IncompleteReadError):
+            if reused:
+                # The server dropped an idle keep-alive connection; retry
+                # once on a fresh one.
+                warm = False
+                continue
+            raise
+        except asyncio.TimeoutError:
+            raise ProbeError(f'Read timed out after {read_timeout:g}s') from None
+        finally:
+            pool.release(url, reader, writer, reusable)
+
+
+async def probe_http(spec, pool, connect_timeout, read_timeout, max_body, timings, state):
+    method = _method(spec)
+    conditional = _conditional_headers(spec, state)
+    url = spec.url
+    loop = asyncio.get_running_loop()
+    budget = _budget(connect_timeout, read_timeout)
+    deadline = None if budget is None else loop.time() + budget
+    for hops in itertools.count():
+        hop = {}
+        request = http_request(url, pool, method, spec.warm, connect_timeout, read_timeout,
+                               max_body, hop, conditional)
+        if hops and deadline is not None:
+            remaining = _time_left(deadline, budget, hops, loop.time())
+            try:
+                code, reason, headers, body = await asyncio.wait_for(request, remaining)
+            except asyncio.TimeoutError:
+                raise ProbeError(f'Timed out after {budget:g}s and {hops} redirects') from None
+        else:
+            code, reason, headers, body = await request
+        _add_timings(timings, hop)
+        url = _redirect_target(spec, url, code, headers, hops)
+        if url is None:
+            break
+    if code == 304 and conditional:
+        return _not_modified(spec, state, reason)
+    digest = fingerprint(body).hexdigest() if state is not None and code == 200 else None
+    return _http_result(spec, code, reason, body, state, headers, digest, timings)
+
+
+async def probe_tcp(spec, pool, connect_timeout, read_timeout, max_body, timings, state):
+    host, port = address(spec)
+    try:
+        _, writer = await asyncio.wait_for(pool.open_connection(host, port, timings=timings),
+                                           connect_timeout)
+    except asyncio.TimeoutError:
+        raise ProbeError(f'Connect timed out after {connect_timeout:g}s') from None
+    writer.close()
+    return True, f'Connected to {host}:{port}'
+
+
+async def probe_dns(spec, pool, connect_timeout, read_timeout, max_body, timings, state):
+    host = urlsplit(spec.url).hostname
+    loop = asyncio.get_running_loop()
+    try:
+        infos = await asyncio.wait_for(loop.getaddrinfo(host, None, type=socket.SOCK_STREAM),
+                                       read_timeout)
+    except asyncio.TimeoutError:
+        raise ProbeError(f'Lookup timed out after {read_timeout:g}s') from None
+    except socket.gaierror as e:
+        return False, f'{host}: {e.strerror}'
+    return True, ', '.join(sorted({info[4][0] for info in infos}))
+
+
+PROBES = {'http': probe_http, 'tcp': probe_tcp, 'ping': probe_tcp, 'dns': probe_dns}
+
+
+async def run_probe(spec, pool, connect_timeout=None, read_timeout=None, max_body=None,
+                    timings=None, state=None):
+    """Run the probe for ``spec``; ``state`` enables conditional HTTP requests."""
+    return await PROBES[spec.type](spec, pool, connect_timeout, read_timeout, max_body,
+                                   {} if timings is None else timings, state)
+
+
+# Blocking probes
+
+def _follow_redirects(spec, sessions, timeout, headers, timings):
+    """Send the check request, following redirects like the asyncio probe does.
+
+    requests cannot bound a whole response, so later hops get their connect
+    and read timeouts cut down to the time left.
+    """
+    url = spec.url
+    budget = _budget(*timeout) if isinstance(timeout, tuple) else timeout
+    deadline = None if budget is None else time.monotonic() + budget
+    hop_timeout = timeout
+    for hops in itertools.count():
+        if hops and deadline is not None:
+            remaining = _time_left(deadline, budget, hops, time.monotonic())
+            hop_timeout = (tuple(min(t, remaining) for t in timeout)
+                           if isinstance(timeout, tuple) else remaining)
+        response = sessions.request(_method(spec), url, warm=spec.warm, timeout=hop_timeout,
+                                    stream=True, headers=headers, allow_redirects=False)
+        # requests does not split out connect and TLS, so they are part of
+        # ttfb here.
+        _add_timings(timings, {'ttfb': int(response.elapsed.total_seconds() * 1000)})
+        try:
+            url = _redirect_target(spec, url, response.status_code, response.headers, hops)
+        except ProbeError:
+            response.close()
+            raise
+        if url is None:
+            return response
+        response.close()
+
+
+def check_http(spec, sessions, timeout, max_body, timings, state):
+    conditional = _conditional_headers(spec, state)
+    response = _follow_redirects(spec, sessions, timeout, conditional, timings)
+    with response:
+        start = time.monotonic()
+        # Bodies that fit into max_body are read to the end so the
+        # connection goes back to the pool; bigger ones are cut off.
+        code = response.status_code
+        if code == 304 and conditional:
+            return _not_modified(spec, state, response.reason)
+        digest = fingerprint() if state is not None and code == 200 else None
+        body = bytearray()
+        read = 0
+        for chunk in response.iter_content(8192):
+            if max_body is not None:
+                chunk = chunk[:max_body - read]
+            read += len(chunk)
+            if spec.keyword:
+                body += chunk
+            if digest is not None:
+                digest.update(chunk)
+            if max_body is not None and read >= max_body:
+                break
+        timings['transfer'] = int((time.monotonic() - start) * 1000)
+        timings['bytes'] = read
+        headers = {name.lower(): value for name, value in response.headers.items()}
+        return _http_result(spec, code, response.reason, bytes(body), state, headers,
+                            digest.hexdigest() if digest is not None else None, timings)
+
+
+def check_tcp(spec, sessions, timeout, max_body, timings, state):
+    host, port = address(spec)
+    connect = timeout[0] if isinstance(timeout, tuple) else timeout
+    addresses = [host]
+    if sessions.resolver is not None:
+        start = time.monotonic()
+        try:
+            addresses = sessions.resolver.resolve(host, port)
+        finally:
+            timings['dns'] = int((time.monotonic() - start) * 1000)
+    error = None
+    for ip in addresses:
+        start = time.monotonic()
+        try:
+            socket.create_connection((ip, port), timeout=connect).close()
+            timings['connect'] = int((time.monotonic() - start) * 1000)
+            return True, f'Connected to {host}:{port}'
+        except OSError as e:
+            error = e
+    raise error
+
+
+def check_dns(spec, sessions, timeout, max_body, timings, state):
+    host = urlsplit(spec.url).hostname
+    try:
+        infos = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        return False, f'{host}: {e.strerror}'
+    return True, ', '.join(sorted({info[4][0] for info in infos}))
+
+
+CHECKS = {'http': check_http, 'tcp': check_tcp, 'ping': check_tcp, 'dns': check_dns}
+
+
+def run_check(spec, sessions, timeout=None, max_body=None, timings=None, state=None):
+    return CHECKS[spec.type](spec, sessions, timeout, max_body,
+                             {} if timings is None else timings, state)
@@ -0,0 +1,175 @@
+import bisect
+
+MINUTE = 60
+HOUR = 3600
+DAY = 86400
+RESOLUTIONS = (MINUTE, HOUR, DAY)
+
+# Upper bounds (ms) of the latency histogram bins; the last bin is unbounded.
+LATENCY_BOUNDS = (5, 10, 20, 30, 50, 75, 100, 150, 200, 300, 500, 750,
+                  1000, 1500, 2000, 3000, 5000, 10000, 30000)
+
+
+class Aggregate:
+    """Count, up count and latency statistics for one rollup bucket."""
+
+    __slots__ = ('count', 'up', 'latency_count', 'latency_min', 'latency_max',
+                 'latency_sum', 'hist', 'stored')
+
+    def __init__(self):
+        self.count = 0
+        self.up = 0
+        self.latency_count = 0
+        self.latency_min = None
+        self.latency_max = None
+        self.latency_sum = 0
+        self.hist = [0] * (len(LATENCY_BOUNDS) + 1)
+        self.stored = (0, 0, 0, 0)
+
+    def add(self, up, latency):
+        self.count += 1
+        if up:
+            self.up += 1
+        if latency is None:
+            return
+        self.latency_count += 1
+        self.latency_sum += latency
+        if self.latency_min is None or latency < self.latency_min:
+            self.latency_min = latency
+        if self.latency_max is None or latency > self.latency_max:
+            self.latency_max = latency
+        self.hist[bisect.bisect_left(LATENCY_BOUNDS, latency)] += 1
+
+    @property
+    def latency_avg(self):
+        if not self.latency_count:
+            return None
+        return round(self.latency_sum / self.latency_count)
+
+    def percentile(self, q):
+        if not self.latency_count:
+            return None
+        rank = q * self.latency_count
+        seen = 0
+        for i, n in enumerate(self.hist):
+            seen += n
+            if seen >= rank:
+                upper = LATENCY_BOUNDS[i] if i < len(LATENCY_BOUNDS) else self.latency_max
+                return min(upper, self.latency_max)
+        return self.latency_max
+
+    def encode_hist(self):
+        hist = list(self.hist)
+        while hist and not hist[-1]:
+            hist.pop()
+        return ','.join(map(str, hist))
+
+    @classmethod
+    def from_row(cls, row):
+        agg = cls()
+        agg.count = row.count
+        agg.up = row.up_count
+        agg.latency_min = row.latency_min
+        agg.latency_max = row.latency_max
+        agg.latency_sum = row.latency_sum or 0
+        if row.latency_hist:
+            for i, n in enumerate(row.latency_hist.split(',')):
+                agg.hist[i] = int(n)
+        agg.latency_count = row.latency_count or 0
+        agg.mark_stored()
+        return agg
+
+    def as_row(self):
+        return {
+            'count': self.count,
+            'up_count': self.up,
+            'latency_min': self.latency_min,
+            'latency_max': self.latency_max,
+            'latency_avg': self.latency_avg,
+            'latency_count': self.latency_count,
+            'latency_sum': self.latency_sum,
+            'latency_p95': self.percentile(0.95),
+            'latency_hist': self.encode_hist(),
+        }
+
+    def _sums(self):
+        return self.count, self.up, self.latency_count, self.latency_sum
+
+    def as_delta_row(self):
+        """:meth:`as_row` with the counts and sums cut down to what was added
+        since :meth:`mark_stored`, for adding onto the stored row."""
+        row = self.as_row()
+        for key, now, stored in zip(('count', 'up_count', 'latency_count', 'latency_sum'),
+                                    self._sums(), self.stored):
+            row[key] = now - stored
+        return row
+
+    def mark_stored(self):
+        self.stored = self._sums()
+
+
+class RollupAccumulator:
+    """Open rollup buckets per monitor and resolution.
+
+    Only the newest couple of buckets per resolution are kept in memory, so
+    older buckets never change. Flushes add what each bucket gained onto the
+    stored row rather than overwriting it, which keeps the checks another
+    process wrote into the same bucket, as when a monitor moves between
+    checker shards.
+    Like :class:`uptime.UptimeTracker` it is only used from the flush thread.
+    """
+
+    keep = 2
+
+    def __init__(self):
+        self._open = {}
+
+    def __contains__(self, monitor_id):
+        return (monitor_id, MINUTE) in self._open
+
+    def track(self, monitor_id):
+        for width in RESOLUTIONS:
+            self._open.setdefault((monitor_id, width), {})
+
+    def load(self, monitor_id, width, bucket, agg):
+        self._open.setdefault((monitor_id, width), {})[bucket] = agg
+
+    def add(self, monitor_id, epoch, up, latency):
+        """Record one check and return the ``(width, bucket)`` keys it touched."""
+        touched = []
+        for width in RESOLUTIONS:
+            buckets = self._open.setdefault((monitor_id, width), {})
+            bucket = int(epoch) // width
+            agg = buckets.get(bucket)
+            if agg is None:
+                if buckets and bucket < min(buckets):
+                    # Too late to merge into memory without the stored row.
+                    continue
+                agg = buckets[bucket] = Aggregate()
+                while len(buckets) > self.keep:
+                    del buckets[min(buckets)]
+            agg.add(up, latency)
+            touched.append((width, bucket))
+        return touched
+
+    def get(self, monitor_id, width, bucket):
+        return self._open.get((monitor_id, width), {}).get(bucket)
+
+    def discard(self, monitor_id):
+        for width in RESOLUTIONS:
+            self._open.pop((monitor_id, width), None)
+
+
+def pick_resolution(start, end, max_points, raw_interval=None):
+    """Return the finest resolution whose bucket count fits into ``max_points``.
+
+    ``None`` means raw history rows are fine (their count is estimated from
+    the monitor's check interval).
+    """
+    span = max(end - start, 1)
+    if raw_interval and span / raw_interval <= max_points:
+        return None
+    for width in RESOLUTIONS:
+        if span / width <= max_points:
+            return width
+    return RESOLUTIONS[-1]
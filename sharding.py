@@ -0,0 +1,56 @@
+import bisect
+import hashlib
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes.
+
+    Adding or removing a worker only moves the monitors that hashed to that
+    worker's points, so a rebalance touches roughly 1/N of the monitors.
+    """
+
+    def __init__(self, nodes=(), vnodes=64):
+        self.vnodes = vnodes
+        self.nodes = tuple(sorted(set(nodes)))
+        points = sorted((_hash(f'{node}#{i}'), node)
+                        for node in self.nodes for i in range(vnodes))
+        self._keys = [p for p, _ in points]
+        self._nodes = [n for _, n in points]
+
+    def owner(self, key):
+        if not self._keys:
+            return None
+        i = bisect.bisect(self._keys, _hash(str(key))) % len(self._keys)
+        return self._nodes[i]
+
+
+class ShardMembership:
+    """This worker's view of the live checker workers and which monitors it owns."""
+
+    def __init__(self, worker_id, vnodes=64):
+        self.worker_id = worker_id
+        self.vnodes = vnodes
+        self.ring = HashRing([worker_id], vnodes)
+
+    @property
+    def members(self):
+        return self.ring.nodes
+
+    @property
+    def is_leader(self):
+        return self.members[0] == self.worker_id
+
+    def update(self, members):
+        """Rebuild the ring for a new member list; returns True if it changed."""
+        members = tuple(sorted(set(members) | {self.worker_id}))
+        if members == self.ring.nodes:
+            return False
+        self.ring = HashRing(members, self.vnodes)
+        return True
+
+    def owns(self, monitor_id):
+        return self.ring.owner(monitor_id) == self.worker_id
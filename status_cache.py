@@ -0,0 +1,149 @@
+import threading
+
+STATUSES = ('up', 'pending', 'down', 'unknown')
+# Statuses that count as available for uptime; pending is an unconfirmed failure.
+AVAILABLE = frozenset(('up', 'pending'))
+SORT_KEYS = {
+    'name': lambda m: (m.name.lower(), m.id),
+    'status': lambda m: (STATUSES.index(m.status) if m.status in STATUSES else len(STATUSES),
+                         m.name.lower(), m.id),
+    'response_time': lambda m: (m.response_time is None, m.response_time or 0, m.id),
+    'last_checked': lambda m: (m.last_checked is None, m.last_checked or 0, m.id),
+}
+
+
+class MonitorStatus:
+    __slots__ = ('id', 'user_id', 'name', 'url', 'interval', 'status',
+                 'response_time', 'last_checked')
+
+    def __init__(self, id, user_id, name, url, interval, status, response_time, last_checked):
+        self.id = id
+        self.user_id = user_id
+        self.name = name
+        self.url = url
+        self.interval = interval
+        self.status = status if status in STATUSES else 'unknown'
+        self.response_time = response_time
+        self.last_checked = last_checked
+
+    def __eq__(self, other):
+        if not isinstance(other, MonitorStatus):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+
+class StatusCache:
+    """Latest status of every monitor plus per-user up/down/unknown counters.
+
+    Status updates adjust the counters in O(1), so the dashboard never has to
+    load or count monitors from the database. ``on_change(record, removed)``
+    is called for every monitor whose state changed, including changes found
+    by a full reload.
+    """
+
+    def __init__(self, on_change=None):
+        self.on_change = on_change
+        self._lock = threading.RLock()
+        self._monitors = {}
+        self._by_user = {}
+        self._counts = {}
+        self.version = 0
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._monitors)
+
+    def __contains__(self, monitor_id):
+        return monitor_id in self._monitors
+
+    def get(self, monitor_id):
+        return self._monitors.get(monitor_id)
+
+    def load(self, records):
+        with self._lock:
+            old = dict(self._monitors) if self.loaded else None
+            self._monitors.clear()
+            self._by_user.clear()
+            self._counts.clear()
+            for record in records:
+                self._add(record)
+            self.loaded = True
+            self.version += 1
+            if old is None or self.on_change is None:
+                return
+            for record in self._monitors.values():
+                if old.pop(record.id, None) != record:
+                    self.on_change(record, False)
+            for record in old.values():
+                self.on_change(record, True)
+
+    def upsert(self, record):
+        with self._lock:
+            self._remove(record.id)
+            self._add(record)
+            self.version += 1
+            if self.on_change is not None:
+                self.on_change(record, False)
+
+    def remove(self, monitor_id):
+        with self._lock:
+            record = self._monitors.get(monitor_id)
+            if self._remove(monitor_id):
+                self.version += 1
+                if self.on_change is not None:
+                    self.on_change(record, True)
+
+    def update_status(self, monitor_id, status, response_time, last_checked):
+        """Apply a check result; returns the record if anything changed."""
+        with self._lock:
+            record = self._monitors.get(monitor_id)
+            if record is None:
+                return None
+            if status not in STATUSES:
+                status = 'unknown'
+            if (record.status, record.response_time, record.last_checked) == \
+                    (status, response_time, last_checked):
+                return None
+            if status != record.status:
+                counts = self._counts[record.user_id]
+                counts[record.status] -= 1
+                counts[status] += 1
+                record.status = status
+            record.response_time = response_time
+            record.last_checked = last_checked
+            self.version += 1
+            if self.on_change is not None:
+                self.on_change(record, False)
+            return record
+
+    def _add(self, record):
+        self._monitors[record.id] = record
+        self._by_user.setdefault(record.user_id, set()).add(record.id)
+        counts = self._counts.setdefault(record.user_id, dict.fromkeys(STATUSES, 0))
+        counts[record.status] += 1
+
+    def _remove(self, monitor_id):
+        record = self._monitors.pop(monitor_id, None)
+        if record is None:
+            return False
+        self._by_user[record.user_id].discard(monitor_id)
+        self._counts[record.user_id][record.status] -= 1
+        return True
+
+    def counts(self, user_id):
+        return dict(self._counts.get(user_id) or dict.fromkeys(STATUSES, 0))
+
+    def page(self, user_id, status=None, search=None, sort='name', descending=False,
+             page=1, per_page=50):
+        """Return ``(records, total)`` for one page of a user's monitors."""
+        with self._lock:
+            records = [self._monitors[i] for i in self._by_user.get(user_id, ())]
+        if status in STATUSES:
+            records = [r for r in records if r.status == status]
+        if search:
+            search = search.lower()
+            records = [r for r in records
+                       if search in r.name.lower() or search in r.url.lower()]
+        records.sort(key=SORT_KEYS.get(sort, SORT_KEYS['name']), reverse=descending)
+        start = (max(page, 1) - 1) * per_page
+        return records[start:start + per_page], len(records)
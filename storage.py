@@ -0,0 +1,121 @@
+"""Database engines: SQLite pragmas and a read/write connection split.
+
+The default engine is the writer. With a ``read`` bind configured,
+:class:`RoutingSession` sends plain SELECTs to it and everything else
+(flushes, bulk INSERT/UPDATE/DELETE, raw SQL) to the writer. Once a
+transaction has written, its later reads stay on the writer so they see
+their own changes; the next transaction reads from the pool again.
+
+For a SQLite file the writer is a single connection per process, so
+threads queue for it instead of retrying on "database is locked", and the
+readers are query-only connections to the same file. In WAL mode readers
+never wait for the writer, nor the writer for them. PostgreSQL keeps its
+usual pool; the ``read`` bind may point at a replica and its sessions are
+read-only. The app's SQL (upserts, RETURNING, migrations) only covers
+these two, so other backends are refused.
+"""
+import sqlalchemy as sa
+from flask_sqlalchemy.session import Session
+
+READ_BIND = 'read'
+BACKENDS = ('sqlite', 'postgresql')
+JOURNAL_MODES = ('WAL', 'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'OFF')
+SYNCHRONOUS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+
+def _sqlite_file(url):
+    url = sa.engine.make_url(url)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def engine_options(url, read_url=None, read_pool_size=5):
+    """``SQLALCHEMY_ENGINE_OPTIONS`` and ``SQLALCHEMY_BINDS`` for ``url``.
+
+    ``read_pool_size`` of 0 leaves out the read pool, as does an in-memory
+    SQLite database, which a second pool could not share.
+    """
+    for name, value in (('DATABASE_URL', url), ('DATABASE_READ_URL', read_url)):
+        backend = sa.engine.make_url(value).get_backend_name() if value else None
+        if value and backend not in BACKENDS:
+            raise ValueError(f'{name}: {backend} databases are not supported, '
+                             'use SQLite or PostgreSQL')
+    options, binds = {}, {}
+    sqlite = sa.engine.make_url(url).get_backend_name() == 'sqlite'
+    if sqlite and not _sqlite_file(url):
+        return options, binds
+    if sqlite:
+        # SQLite takes one writer at a time anyway.
+        options.update(pool_size=1, max_overflow=0)
+    if read_pool_size:
+        binds[READ_BIND] = {'url': read_url or url, 'pool_size': read_pool_size}
+    return options, binds
+
+
+def sqlite_pragmas(writer=True, journal_mode='WAL', synchronous='NORMAL', mmap_size=0,
+                   cache_size=-2000, busy_timeout=5000):
+    """A ``connect`` listener that sets the pragmas on each new SQLite connection.
+
+    ``cache_size`` counts pages, or KiB when negative. Readers get
+    ``query_only`` instead of the journal and sync settings.
+    """
+    journal_mode, synchronous = journal_mode.upper(), synchronous.upper()
+    if journal_mode not in JOURNAL_MODES:
+        raise ValueError(f'Unknown SQLite journal mode {journal_mode!r}')
+    if synchronous not in SYNCHRONOUS:
+        raise ValueError(f'Unknown SQLite synchronous setting {synchronous!r}')
+    statements = [f'PRAGMA busy_timeout = {int(busy_timeout)}',
+                  f'PRAGMA mmap_size = {int(mmap_size)}',
+                  f'PRAGMA cache_size = {int(cache_size)}']
+    if writer:
+        statements += [f'PRAGMA journal_mode = {journal_mode}',
+                       f'PRAGMA synchronous = {synchronous}']
+    else:
+        statements.append('PRAGMA query_only = ON')
+
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for statement in statements:
+            cursor.execute(statement).fetchall()
+        cursor.close()
+    return on_connect
+
+
+def _read_only_session(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('SET SESSION CHARACTERISTICS AS TRANSACTION READ ONLY')
+    cursor.close()
+    dbapi_connection.commit()
+
+
+def configure(engines, **pragmas):
+    """Set up new connections of ``db.engines``: :func:`sqlite_pragmas` for
+    SQLite, read-only sessions for a PostgreSQL read pool."""
+    for key, engine in engines.items():
+        if engine.dialect.name == 'sqlite':
+            sa.event.listen(engine, 'connect', sqlite_pragmas(writer=key is None, **pragmas))
+        elif key == READ_BIND:
+            sa.event.listen(engine, 'connect', _read_only_session)
+
+
+class RoutingSession(Session):
+    """``db.session`` that reads from the ``read`` bind while it has not written."""
+
+    def __init__(self, db, **kwargs):
+        super().__init__(db, **kwargs)
+        self.wrote = False
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self.wrote and not self._flushing \
+                and isinstance(clause, sa.Select):
+            reader = self._db.engines.get(READ_BIND)
+            if reader is not None:
+                return reader
+        if bind is None:
+            self.wrote = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@sa.event.listens_for(RoutingSession, 'after_transaction_end')
+def _transaction_end(session, transaction):
+    if transaction.parent is None:
+        session.wrote = False
@@ -0,0 +1,221 @@
+"""Fake HTTP and TCP targets for load tests.
+
+    python target_farm.py [--ports 20] [--latency-ms 20] [--error-rate 0.01] ...
+
+Every listener runs on one asyncio loop. HTTP paths choose the behaviour:
+``/ok``, ``/error`` (500), ``/slow`` (``slow_ms`` extra) and ``/hang``
+(never answers, holds the connection until the client gives up). Any other
+path draws a behaviour from the configured rates. With ``etag`` set, 200
+responses carry an ETag and matching If-None-Match requests get a 304.
+TCP listeners accept and close. Several ports stand in for several hosts,
+so per-host limits of the checker behave as they would against a real
+fleet.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import random
+import threading
+from collections import Counter
+
+BEHAVIOURS = ('ok', 'error', 'slow', 'hang')
+
+
+class TargetFarm:
+    def __init__(self, ports=1, latency_ms=20, jitter_ms=5, error_rate=0.0, slow_rate=0.0,
+                 hang_rate=0.0, slow_ms=2000, body_bytes=1024, etag=False, host='127.0.0.1',
+                 seed=None):
+        self.ports = ports
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.hang_rate = hang_rate
+        self.slow_ms = slow_ms
+        self.body_bytes = body_bytes
+        self.etag = f'"{body_bytes}"' if etag else None
+        self.host = host
+        self.http_ports = []
+        self.tcp_ports = []
+        self.served = Counter()
+        self.connections = 0
+        self._random = random.Random(seed)
+        self._body = b'x' * body_bytes
+        self.loop = None
+        self._servers = []
+        self._thread = None
+        self._ready = threading.Event()
+
+    def behaviour(self, path):
+        name = path.strip('/').split('/', 1)[0].split('?', 1)[0]
+        if name in BEHAVIOURS:
+            return name
+        draw = self._random.random()
+        for name, rate in (('error', self.error_rate), ('slow', self.slow_rate),
+                           ('hang', self.hang_rate)):
+            if draw < rate:
+                return name
+            draw -= rate
+        return 'ok'
+
+    def _delay(self, behaviour):
+        delay = self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        if behaviour == 'slow':
+            delay += self.slow_ms
+        return max(delay, 0) / 1000
+
+    async def _handle_http(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                method, path = line.decode('latin-1').split(' ', 2)[:2]
+                keep_alive = True
+                if_none_match = None
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = header.decode('latin-1').partition(':')
+                    name = name.strip().lower()
+                    if name == 'connection':
+                        keep_alive = value.strip().lower() != 'close'
+                    elif name == 'if-none-match':
+                        if_none_match = value.strip()
+                behaviour = self.behaviour(path)
+                self.served[behaviour] += 1
+                if behaviour == 'hang':
+                    await reader.read()
+                    return
+                await asyncio.sleep(self._delay(behaviour))
+                code, reason = (500, 'Internal Server Error') if behaviour == 'error' else (200, 'OK')
+                etag = self.etag if code == 200 else None
+                if etag and if_none_match == etag:
+                    code, reason = 304, 'Not Modified'
+                    self.served['not_modified'] += 1
+                length = self.body_bytes if code != 304 else 0
+                writer.write((
+                    f'HTTP/1.1 {code} {reason}\r\n'
+                    f'Content-Length: {length}\r\n'
+                    'Content-Type: text/plain\r\n'
+                    + (f'ETag: {etag}\r\n' if etag else '')
+                    + f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'
+                ).encode('latin-1'))
+                if method != 'HEAD' and length:
+                    writer.write(self._body)
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_tcp(self, reader, writer):
+        self.connections += 1
+        self.served['tcp'] += 1
+        writer.close()
+
+    async def _listen(self):
+        for _ in range(self.ports):
+            for handler, ports in ((self._handle_http, self.http_ports),
+                                   (self._handle_tcp, self.tcp_ports)):
+                server = await asyncio.start_server(handler, self.host, 0, backlog=1024)
+                self._servers.append(server)
+                ports.append(server.sockets[0].getsockname()[1])
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        self.loop.run_until_complete(self._listen())
+        self._ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            for server in self._servers:
+                server.close()
+            self.loop.close()
+
+    def start(self):
+        """Start listening on a background thread; returns ``(http_ports, tcp_ports)``."""
+        self._thread = threading.Thread(target=self._run, name='target-farm', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self.http_ports, self.tcp_ports
+
+    def stop(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(5)
+
+    def stats(self):
+        return {'connections': self.connections, 'served': dict(self.served)}
+
+
+def _serve(conn, options):
+    farm = TargetFarm(**options)
+    conn.send(farm.start())
+    while conn.recv() == 'stats':
+        conn.send(farm.stats())
+    farm.stop()
+
+
+class FarmProcess:
+    """A :class:`TargetFarm` in a child process, so it does not compete with
+    the process under test for the GIL."""
+
+    def __init__(self, **options):
+        self._conn, child = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=_serve, args=(child, options),
+                                                name='target-farm', daemon=True)
+        self._process.start()
+        self.http_ports, self.tcp_ports = self._conn.recv()
+
+    def stats(self):
+        self._conn.send('stats')
+        return self._conn.recv()
+
+    def stop(self):
+        self._conn.send('stop')
+        self._process.join(5)
+
+
+def add_arguments(parser):
+    parser.add_argument('--ports', type=int, default=20, help='listeners per protocol')
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--jitter-ms', type=float, default=5)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--slow-rate', type=float, default=0.0)
+    parser.add_argument('--hang-rate', type=float, default=0.0)
+    parser.add_argument('--slow-ms', type=float, default=2000)
+    parser.add_argument('--body-bytes', type=int, default=1024)
+    parser.add_argument('--etag', action='store_true', help='support If-None-Match / 304')
+    parser.add_argument('--seed', type=int)
+
+
+def farm_options(args):
+    return {'ports': args.ports, 'latency_ms': args.latency_ms, 'jitter_ms': args.jitter_ms,
+            'error_rate': args.error_rate, 'slow_rate': args.slow_rate,
+            'hang_rate': args.hang_rate, 'slow_ms': args.slow_ms,
+            'body_bytes': args.body_bytes, 'etag': args.etag, 'seed': args.seed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve fake HTTP and TCP targets.')
+    add_arguments(parser)
+    args = parser.parse_args()
+    farm = TargetFarm(**farm_options(args))
+    http_ports, tcp_ports = farm.start()
+    print(json.dumps({'host': farm.host, 'http_ports': http_ports, 'tcp_ports': tcp_ports}),
+          flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        print(json.dumps(farm.stats()))
+        farm.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import logging
+import os
+
+from flask import template_rendered, before_render_template
+from jinja2 import FileSystemBytecodeCache
+
+logger = logging.getLogger(__name__)
+
+
+class TemplateRegistry:
+    """Compiled templates of a Flask app, loaded once at startup.
+
+    Compiled bytecode is kept in ``cache_dir`` so a restart only unmarshals
+    code instead of parsing and compiling the sources again. Outside debug
+    mode templates are never re-checked on disk, so rendering a page is a
+    dict lookup plus running the compiled code.
+    """
+
+    def __init__(self, app, cache_dir=None):
+        self.app = app
+        env = app.jinja_env
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+        env.auto_reload = app.debug or app.config.get('TEMPLATES_AUTO_RELOAD') is True
+        # Keep every template compiled instead of Jinja's default LRU of 400.
+        env.cache = {}
+        self._templates = {}
+
+    def names(self):
+        return [name for name in self.app.jinja_env.list_templates()
+                if name.endswith('.html')]
+
+    def preload(self):
+        """Compile every template now; returns the number loaded."""
+        for name in self.names():
+            self._templates[name] = self.app.jinja_env.get_template(name)
+        logger.info('Loaded %d templates', len(self._templates))
+        return len(self._templates)
+
+    def get(self, name):
+        template = self._templates.get(name)
+        if template is None or self.app.jinja_env.auto_reload:
+            template = self._templates[name] = self.app.jinja_env.get_template(name)
+        return template
+
+    def _context(self, context):
+        self.app.update_template_context(context)
+        return context
+
+    def render(self, name, **context):
+        """Like ``flask.render_template`` but without the per-call template lookup."""
+        template = self.get(name)
+        context = self._context(context)
+        before_render_template.send(self.app, _async_wrapper=self.app.ensure_sync,
+                                    template=template, context=context)
+        html = template.render(context)
+        template_rendered.send(self.app, _async_wrapper=self.app.ensure_sync,
+                               template=template, context=context)
+        return html
+
+    def render_block(self, name, block, **context):
+        """Render a single ``{% block %}`` of a template, for partial page updates."""
+        template = self.get(name)
+        render = template.blocks.get(block)
+        if render is None:
+            raise KeyError(f'{name} has no block {block!r}')
+        ctx = template.new_context(self._context(context))
+        return ''.join(render(ctx))
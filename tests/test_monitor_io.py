@@ -0,0 +1,149 @@
+import io
+import json
+import random
+
+import pytest
+
+import monitor_io
+
+
+def read_json(data, chunk_size=None, monkeypatch=None):
+    if chunk_size is not None:
+        monkeypatch.setattr(monitor_io, 'CHUNK_SIZE', chunk_size)
+    return list(monitor_io.read_json(io.BytesIO(data.encode('utf-8'))))
+
+
+def values(rows):
+    for number, value in rows:
+        assert not isinstance(value, ValueError), (number, value)
+    return [value for _, value in rows]
+
+
+def random_value(rng, depth=0):
+    kind = rng.choice(('int', 'float', 'exp', 'str', 'literal', 'list', 'dict')
+                      if depth < 2 else ('int', 'float', 'exp', 'str', 'literal'))
+    if kind == 'int':
+        return rng.randint(-10**6, 10**6)
+    if kind == 'float':
+        return round(rng.uniform(-1000, 1000), rng.randint(1, 6))
+    if kind == 'exp':
+        return float(f'{rng.randint(1, 9)}.{rng.randint(0, 99)}e{rng.randint(-30, 30)}')
+    if kind == 'str':
+        return ''.join(rng.choice('ab ,]["\\é\n') for _ in range(rng.randint(0, 8)))
+    if kind == 'literal':
+        return rng.choice((True, False, None))
+    if kind == 'list':
+        return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 3))]
+    return {f'k{i}': random_value(rng, depth + 1) for i in range(rng.randint(0, 3))}
+
+
+def test_read_json_rows_are_numbered():
+    rows = read_json('[{"name": "a"}, {"name": "b"}]')
+    assert rows == [(1, {'name': 'a'}), (2, {'name': 'b'})]
+
+
+def test_read_json_empty_array_and_bom():
+    assert read_json('[]') == []
+    assert values(list(monitor_io.read_json(io.BytesIO(b'\xef\xbb\xbf[1]')))) == [1]
+
+
+@pytest.mark.parametrize('text', ['-0.25', '1.5e10', '-12e-3', '0.000001', '123456789', '1E+2'])
+def test_read_json_number_cut_at_chunk_boundary(text, monkeypatch):
+    data = f'[{text}, 7]'
+    for size in range(1, len(data) + 1):
+        assert values(read_json(data, size, monkeypatch)) == [json.loads(text), 7], size
+
+
+def test_read_json_matches_json_loads_for_any_chunk_size(monkeypatch):
+    rng = random.Random(0)
+    for _ in range(300):
+        expected = [random_value(rng) for _ in range(rng.randint(0, 6))]
+        data = json.dumps(expected, indent=rng.choice((None, 1)))
+        size = rng.randint(1, 16)
+        assert values(read_json(data, size, monkeypatch)) == expected, (data, size)
+
+
+@pytest.mark.parametrize('data, message', [
+    ('', 'expected a JSON array'),
+    ('{"name": "a"}', 'expected a JSON array'),
+    ('[1, 2', 'unterminated JSON array'),
+    ('[1 2]', 'expected "," after element 1'),
+    ('[1] [2]', 'unexpected data after the JSON array'),
+    ('[1, {"name": }]', 'invalid JSON'),
+    ('[1.x]', 'expected "," after element 1'),
+])
+def test_read_json_errors_end_the_import(data, message, monkeypatch):
+    for size in (1, 3, 64 * 1024):
+        rows = read_json(data, size, monkeypatch)
+        number, error = rows[-1]
+        assert isinstance(error, ValueError)
+        assert str(error).startswith(message), (size, error)
+        assert all(not isinstance(value, ValueError) for _, value in rows[:-1])
+
+
+def test_read_json_lines_reports_bad_lines():
+    stream = io.BytesIO(b'{"name": "a"}\n\nnot json\n{"name": "b"}\n')
+    rows = list(monitor_io.read_json_lines(stream))
+    assert [number for number, _ in rows] == [1, 3, 4]
+    assert isinstance(rows[1][1], ValueError)
+    assert rows[2][1] == {'name': 'b'}
+
+
+def test_read_csv_numbers_rows_by_line():
+    stream = io.BytesIO(b'\xef\xbb\xbfname,url\na,http://a\nb,http://b\n')
+    assert list(monitor_io.read_csv(stream)) == [
+        (2, {'name': 'a', 'url': 'http://a'}), (3, {'name': 'b', 'url': 'http://b'})]
+
+
+def test_validate_accepts_integral_numbers():
+    row = monitor_io.validate({'name': 'a', 'url': 'https://example.com', 'interval': 120.0,
+                               'retries': ' 3 ', 'retry_interval': '30'})
+    assert (row['interval'], row['retries'], row['retry_interval']) == (120, 3, 30)
+
+
+def test_validate_fills_defaults():
+    row = monitor_io.validate({'name': ' site ', 'url': 'https://example.com'})
+    assert row == {'name': 'site', 'type': 'http', 'url': 'https://example.com',
+                   'interval': 60, 'retries': 0, 'retry_interval': 60,
+                   'latency_mode': 'warm', 'http_method': 'GET', 'keyword': None,
+                   'accepted_statuses': None}
+
+
+@pytest.mark.parametrize('row, message', [
+    ({'url': 'https://example.com'}, 'name is required'),
+    ({'name': 'a', 'url': 'ftp://example.com'}, 'url must be an http(s) URL'),
+    ({'name': 'a', 'url': 'https://example.com', 'interval': 5}, 'interval must be between 10'),
+    ({'name': 'a', 'url': 'https://example.com', 'interval': 'x'}, 'interval must be an integer'),
+    ({'name': 'a', 'type': 'tcp', 'url': 'example.com'}, 'tcp monitors need a port'),
+    ({'name': 'a', 'url': 'https://example.com', 'accepted_statuses': '2x'},
+     'invalid status code range'),
+    ({'name': 'a', 'url': 'https://example.com', 'http_method': 5},
+     'http_method must be a string'),
+    ({'name': 5, 'url': 'https://example.com'}, 'name must be a string'),
+    ({'name': 'a', 'url': ['https://example.com']}, 'url must be a string'),
+    ({'name': 'a', 'url': 'https://example.com', 'keyword': {}}, 'keyword must be a string'),
+    ({'name': 'a', 'url': 'https://example.com', 'interval': 10**30}, 'interval must be between'),
+    ({'name': 'a', 'url': 'https://example.com', 'interval': '1' * 40},
+     'interval must be an integer'),
+    ({'name': 'a', 'url': 'https://example.com', 'interval': 86401}, 'interval must be between'),
+    ({'name': 'a', 'url': 'https://example.com', 'interval': 60.5}, 'interval must be an integer'),
+    ({'name': 'a', 'url': 'https://example.com', 'interval': True}, 'interval must be an integer'),
+    ({'name': 'a', 'url': 'https://example.com', 'retries': 11}, 'retries must be between'),
+    ({'name': 'a', 'url': 'https://example.com', 'retries': -1}, 'retries must be between'),
+    ({'name': 'a', 'url': 'https://example.com', 'retry_interval': 5},
+     'retry_interval must be between'),
+])
+def test_validate_rejects(row, message):
+    with pytest.raises(ValueError, match=message.replace('(', r'\(').replace(')', r'\)')):
+        monitor_io.validate(row)
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'json', 'jsonl'])
+def test_export_reads_back(fmt):
+    rows = [monitor_io.validate({'name': f'm{i}', 'url': f'https://example.com/{i}',
+                                 'keyword': 'ok' if i % 2 else None})
+            for i in range(3)]
+    write, _ = monitor_io.WRITERS[fmt]
+    data = ''.join(write(rows)).encode('utf-8')
+    read = monitor_io.READERS[fmt]
+    assert [monitor_io.validate(row) for _, row in read(io.BytesIO(data))] == rows
@@ -0,0 +1,113 @@
+import threading
+import time
+
+from notifications import DeliveryError, Notifier, Outbox, Transition, summary
+
+
+class FlakyChannel:
+    """Fails the first ``failures`` sends; records when each attempt came."""
+
+    name = 'flaky'
+
+    def __init__(self, failures=0, retry_after=None):
+        self.failures = failures
+        self.retry_after = retry_after
+        self.attempts = []
+        self.delivered = []
+        self.done = threading.Event()
+
+    def send(self, payload):
+        self.attempts.append(time.monotonic())
+        if len(self.attempts) <= self.failures:
+            raise DeliveryError('unavailable', retry_after=self.retry_after)
+        self.delivered.append(payload)
+        self.done.set()
+
+
+def change(monitor_id, status='down'):
+    return {'id': monitor_id, 'name': f'm{monitor_id}', 'status': status, 'message': None}
+
+
+def test_backoff_is_not_cut_short_by_new_messages():
+    channel = FlakyChannel(failures=2)
+    outbox = Outbox(channel, rate=100, per=1, retries=3, backoff=0.3)
+    outbox.start()
+    try:
+        outbox.put([change(1)])
+        deadline = time.monotonic() + 0.8
+        while time.monotonic() < deadline:
+            outbox.put([change(2)])
+            time.sleep(0.02)
+        assert channel.done.wait(2)
+    finally:
+        outbox.stop()
+    first, second, third = channel.attempts[:3]
+    assert second - first >= 0.3
+    assert third - second >= 0.6
+    assert outbox.failed == 0
+
+
+def test_retry_after_is_honoured():
+    channel = FlakyChannel(failures=1, retry_after=0.4)
+    outbox = Outbox(channel, rate=100, per=1, retries=2, backoff=0.05)
+    outbox.start()
+    try:
+        outbox.put([change(1)])
+        time.sleep(0.05)
+        outbox.put([change(2)])
+        assert channel.done.wait(2)
+    finally:
+        outbox.stop()
+    assert channel.attempts[1] - channel.attempts[0] >= 0.4
+
+
+def test_stop_interrupts_backoff():
+    channel = FlakyChannel(failures=10)
+    outbox = Outbox(channel, rate=100, per=1, retries=5, backoff=30)
+    outbox.start()
+    outbox.put([change(1)])
+    time.sleep(0.1)
+    started = time.monotonic()
+    outbox.stop()
+    assert time.monotonic() - started < 2
+    assert outbox.failed == 1
+
+
+def test_queued_messages_are_merged():
+    channel = FlakyChannel(failures=1)
+    outbox = Outbox(channel, rate=100, per=1, retries=1, backoff=0.2)
+    outbox.start()
+    try:
+        outbox.put([change(1)])
+        time.sleep(0.05)
+        outbox.put([change(2)])
+        outbox.put([change(3)])
+        deadline = time.monotonic() + 2
+        while len(channel.delivered) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        outbox.stop()
+    assert [[c['id'] for c in p['changes']] for p in channel.delivered] == [[1], [2, 3]]
+
+
+def test_notifier_drops_flip_backs_and_batches():
+    channel = FlakyChannel()
+    notifier = Notifier([channel], lambda ids: {i: {'name': f'm{i}', 'url': ''} for i in ids},
+                        window=0.2, rate=100, per=1)
+    notifier.start()
+    try:
+        now = time.time()
+        notifier.add(Transition(1, 'up', 'down', 'timeout', now))
+        notifier.add(Transition(1, 'down', 'up', None, now))
+        notifier.add(Transition(2, 'up', 'down', '500', now))
+        notifier.add(Transition(3, 'up', 'down', '500', now))
+        assert channel.done.wait(2)
+    finally:
+        notifier.stop()
+    payload, = channel.delivered
+    assert [c['id'] for c in payload['changes']] == [2, 3]
+    assert payload['text'] == '2 monitors down'
+
+
+def test_summary_of_one_change_names_the_monitor():
+    assert summary([dict(change(1), message='timeout')]) == 'm1 is down: timeout'
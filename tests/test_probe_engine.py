@@ -0,0 +1,28 @@
+import threading
+
+import probe_engine
+from probe_engine import ProbeEngine
+from probes import ProbeSpec
+
+
+def test_unexpected_probe_error_records_down_result(monkeypatch):
+    async def broken(*args):
+        raise KeyError('boom')
+    monkeypatch.setattr(probe_engine, 'run_probe', broken)
+    results = []
+    done = threading.Event()
+
+    def on_result(result):
+        results.append(result)
+        done.set()
+    engine = ProbeEngine(on_result)
+    engine.start()
+    try:
+        spec = ProbeSpec('http', 'http://example.invalid/', 60, True, 'GET', None, None, 0)
+        assert engine.submit(7, spec, (1, 1))
+        assert done.wait(5)
+        assert engine.submit(7, spec, (1, 1))
+    finally:
+        engine.stop()
+    result = results[0]
+    assert (result.monitor_id, result.status, result.message) == (7, 'down', "'boom'")
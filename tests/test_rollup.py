@@ -0,0 +1,27 @@
+from rollup import Aggregate
+
+
+def test_delta_row_holds_what_was_added_since_stored():
+    agg = Aggregate()
+    agg.add(True, 40)
+    agg.add(False, None)
+    assert agg.as_delta_row()['count'] == 2
+    agg.mark_stored()
+    agg.add(True, 60)
+    row = agg.as_delta_row()
+    assert (row['count'], row['up_count'], row['latency_count'], row['latency_sum']) == (1, 1, 1, 60)
+    assert (row['latency_min'], row['latency_max']) == (40, 60)
+
+
+def test_loaded_row_counts_as_stored():
+    agg = Aggregate()
+    agg.add(True, 40)
+
+    class Row:
+        count, up_count, latency_count, latency_sum = 1, 1, 1, 40
+        latency_min = latency_max = 40
+        latency_hist = agg.encode_hist()
+    loaded = Aggregate.from_row(Row)
+    assert loaded.as_delta_row()['count'] == 0
+    loaded.add(False, None)
+    assert (loaded.as_delta_row()['count'], loaded.as_delta_row()['up_count']) == (1, 0)
@@ -0,0 +1,73 @@
+"""Downsampling and wire encodings for chart series.
+
+A series is columnar: ``t`` (epoch seconds), ``latency`` (ms, ``None`` when
+there was no response) and ``up`` (1 if every check behind the point was up).
+"""
+import array
+import struct
+import sys
+
+BINARY_MAGIC = b'UPTS'
+BINARY_VERSION = 1
+# magic, version, flags, padding, point count, resolution in seconds (0 = raw checks)
+BINARY_HEADER = struct.Struct('<4sBBxxII')
+NO_LATENCY = -1
+
+
+def lttb(t, latency, up, threshold):
+    """Largest-Triangle-Three-Buckets downsampling to at most ``threshold`` points.
+
+    Keeps the visual shape of the latency line. A point's ``up`` bit is the
+    minimum over the bucket it stands for, so an outage is never sampled
+    away. Missing latencies count as zero for the triangle areas.
+    """
+    n = len(t)
+    if threshold >= n or threshold < 3:
+        return list(t), list(latency), list(up)
+    y = [v or 0 for v in latency]
+    out = [0]
+    bounds = [(0, 1)]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        # Average of the next bucket is the third corner of the triangle.
+        next_end = min(int((i + 2) * every) + 1, n)
+        next_start = min(end, n - 1)
+        span = max(next_end - next_start, 1)
+        avg_x = sum(t[next_start:next_end] or [t[-1]]) / span
+        avg_y = sum(y[next_start:next_end] or [y[-1]]) / span
+        best, best_area = start, -1.0
+        ax, ay = t[a], y[a]
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (y[j] - ay) - (ax - t[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        out.append(best)
+        bounds.append((start, end))
+        a = best
+    out.append(n - 1)
+    bounds.append((n - 1, n))
+    return ([t[i] for i in out],
+            [latency[i] for i in out],
+            [min(up[s:e]) for s, e in bounds])
+
+
+def as_json(t, latency, up, width):
+    return {'resolution': width or 0, 't': t, 'latency': latency, 'up': up}
+
+
+def as_binary(t, latency, up, width):
+    """Header, then little-endian int32 epochs, int32 latencies (-1 = none) and up bits."""
+    epochs = array.array('i', t)
+    latencies = array.array('i', (NO_LATENCY if v is None else v for v in latency))
+    bits = bytearray((len(up) + 7) // 8)
+    for i, bit in enumerate(up):
+        if bit:
+            bits[i >> 3] |= 1 << (i & 7)
+    if sys.byteorder == 'big':
+        epochs.byteswap()
+        latencies.byteswap()
+    return (BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, 0, len(t), width or 0)
+            + epochs.tobytes() + latencies.tobytes() + bytes(bits))
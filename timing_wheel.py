@@ -0,0 +1,249 @@
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def phase_offset(monitor_id, interval):
+    # Knuth's multiplicative hash spreads consecutive ids evenly over the interval.
+    return (monitor_id * 2654435761 % 2**32) / 2**32 * interval
+
+
+class TimingWheel:
+    """Hashed timing wheel with O(1) schedule and cancel.
+
+    Time is cut into ``tick`` second steps and timers are hashed into
+    ``slots`` buckets by their due tick. Timers more than one revolution away
+    simply stay in their bucket until the wheel reaches their tick, so each
+    step only looks at one bucket.
+    """
+
+    def __init__(self, on_expire, tick=0.1, slots=512, overdue_after=1.0):
+        self.on_expire = on_expire
+        self.tick = tick
+        self.overdue_after = overdue_after
+        self._slots = [{} for _ in range(slots)]
+        self._timers = {}
+        self._lock = threading.Lock()
+        self._origin = time.monotonic()
+        self._current = 0
+        self._stopping = threading.Event()
+        self._thread = None
+        self.dispatched = 0
+        self.overdue = 0
+        self.lag_last = 0.0
+        self.lag_max = 0.0
+        self._lag_total = 0.0
+
+    def __len__(self):
+        return len(self._timers)
+
+    def __contains__(self, key):
+        return key in self._timers
+
+    def schedule(self, key, due):
+        """Fire ``on_expire(key, due)`` at monotonic time ``due``, replacing any timer for ``key``."""
+        tick = max(math.ceil((due - self._origin) / self.tick), 0)
+        with self._lock:
+            self._cancel(key)
+            tick = max(tick, self._current + 1)
+            slot = tick % len(self._slots)
+            self._slots[slot][key] = (tick, due)
+            self._timers[key] = slot
+
+    def cancel(self, key):
+        with self._lock:
+            return self._cancel(key)
+
+    def _cancel(self, key):
+        slot = self._timers.pop(key, None)
+        if slot is None:
+            return False
+        del self._slots[slot][key]
+        return True
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name='timing-wheel', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while not self._stopping.is_set():
+            now = time.monotonic()
+            target = int((now - self._origin) / self.tick)
+            while self._current < target:
+                self._advance()
+            next_tick = self._origin + (self._current + 1) * self.tick
+            self._stopping.wait(max(next_tick - time.monotonic(), 0))
+
+    def _advance(self):
+        with self._lock:
+            self._current += 1
+            bucket = self._slots[self._current % len(self._slots)]
+            expired = [(key, due) for key, (tick, due) in bucket.items() if tick <= self._current]
+            for key, _ in expired:
+                del bucket[key]
+                del self._timers[key]
+        now = time.monotonic()
+        for key, due in expired:
+            lag = max(now - due, 0.0)
+            self.dispatched += 1
+            self.lag_last = lag
+            self._lag_total += lag
+            if lag > self.lag_max:
+                self.lag_max = lag
+            if lag > self.overdue_after:
+                self.overdue += 1
+            try:
+                self.on_expire(key, due)
+            except Exception:
+                logger.exception('Timer callback for %r failed', key)
+
+    def stats(self):
+        return {
+            'scheduled': len(self._timers),
+            'dispatched': self.dispatched,
+            'overdue': self.overdue,
+            'lag_last': self.lag_last,
+            'lag_max': self.lag_max,
+            'lag_avg': self._lag_total / self.dispatched if self.dispatched else 0.0,
+        }
+
+
+class Heartbeat:
+    __slots__ = ('monitor_id', 'interval', 'retries', 'retry_interval', 'target', 'failures',
+                 'confirmed')
+
+    def __init__(self, monitor_id, interval, retries, retry_interval, target):
+        self.monitor_id = monitor_id
+        self.interval = interval
+        self.retries = retries
+        self.retry_interval = retry_interval
+        self.target = target
+        self.failures = 0
+        # Last confirmed state, 'up' or 'down'; None until one is known.
+        self.confirmed = None
+
+    def settings(self):
+        return self.interval, self.retries, self.retry_interval, self.target
+
+
+class HeartbeatScheduler:
+    """Dispatches monitor checks from a timing wheel.
+
+    Regular checks stay on a fixed per-monitor phase of their interval, so
+    they never drift and same-interval monitors do not fire together.
+
+    Failed checks drive a small state machine: the first ``retries``
+    consecutive failures only make the monitor ``pending`` and it is retried
+    every ``retry_interval`` seconds. The next failure confirms it ``down``
+    and checks fall back to the regular interval; any success makes it
+    ``up`` again. Only moves between confirmed states, never ``pending``,
+    are passed to ``on_transition(monitor_id, old, new, detail)``, with the
+    ``detail`` given to :meth:`report`. ``old`` is None for the first state
+    seen after scheduling unless the monitor was added ``down``; a first
+    ``up`` is not a transition.
+    """
+
+    def __init__(self, dispatch, tick=0.1, slots=512, on_transition=None):
+        self.dispatch = dispatch
+        self.on_transition = on_transition
+        self.wheel = TimingWheel(self._expire, tick=tick, slots=slots)
+        self._beats = {}
+
+    def __len__(self):
+        return len(self._beats)
+
+    def __contains__(self, monitor_id):
+        return monitor_id in self._beats
+
+    def start(self):
+        self.wheel.start()
+
+    def stop(self):
+        self.wheel.stop()
+
+    def settings(self, monitor_id):
+        beat = self._beats.get(monitor_id)
+        return beat.settings() if beat else None
+
+    def ids(self):
+        return list(self._beats)
+
+    def add(self, monitor_id, interval, retries=0, retry_interval=None, target=None,
+            down=False):
+        """Schedule a monitor; ``down`` restores a monitor already confirmed down."""
+        beat = Heartbeat(monitor_id, interval, retries, retry_interval or interval, target)
+        old = self._beats.get(monitor_id)
+        if old is not None:
+            beat.failures = old.failures
+            beat.confirmed = old.confirmed
+        elif down:
+            beat.failures = retries + 1
+            beat.confirmed = 'down'
+        self._beats[monitor_id] = beat
+        self._schedule_at(monitor_id, self._next_regular(beat, time.time()))
+
+    def remove(self, monitor_id):
+        self._beats.pop(monitor_id, None)
+        self.wheel.cancel(monitor_id)
+
+    def report(self, monitor_id, up, detail=None):
+        """Feed a check result back; returns the status to record for it.
+
+        That is ``up``, ``pending`` while retries are left, or ``down``.
+        """
+        beat = self._beats.get(monitor_id)
+        if up:
+            if beat is not None:
+                beat.failures = 0
+                self._confirm(beat, 'up', detail)
+            return 'up'
+        if beat is None:
+            return 'down'
+        beat.failures += 1
+        if beat.failures > beat.retries:
+            self._confirm(beat, 'down', detail)
+            return 'down'
+        now = time.time()
+        retry_at = now + beat.retry_interval
+        if retry_at < self._next_regular(beat, now):
+            self._schedule_at(monitor_id, retry_at)
+        return 'pending'
+
+    def _confirm(self, beat, state, detail):
+        old, beat.confirmed = beat.confirmed, state
+        if old == state or (old is None and state == 'up') or self.on_transition is None:
+            return
+        try:
+            self.on_transition(beat.monitor_id, old, state, detail)
+        except Exception:
+            logger.exception('Transition callback for monitor %s failed', beat.monitor_id)
+
+    def _next_regular(self, beat, now):
+        offset = phase_offset(beat.monitor_id, beat.interval)
+        return offset + (math.floor((now - offset) / beat.interval) + 1) * beat.interval
+
+    def _schedule_at(self, monitor_id, wall_time):
+        self.wheel.schedule(monitor_id, time.monotonic() + (wall_time - time.time()))
+
+    def _expire(self, monitor_id, due):
+        beat = self._beats.get(monitor_id)
+        if beat is None:
+            return
+        self._schedule_at(monitor_id, self._next_regular(beat, time.time() + self.wheel.tick))
+        self.dispatch(monitor_id, beat.target)
+
+    def stats(self):
+        return dict(self.wheel.stats(), monitors=len(self._beats))
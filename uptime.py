@@ -0,0 +1,125 @@
+MINUTE = 60
+HOUR = 3600
+
+# (bucket width in seconds, number of buckets) for the 24-hour and 30-day windows
+WINDOW_24H = (MINUTE, 24 * 60)
+WINDOW_30D = (HOUR, 30 * 24)
+
+
+class UptimeWindow:
+    """Up/total counters for a sliding window, kept in a ring of fixed-width buckets.
+
+    ``add`` and ``percent`` are O(1) amortised: moving the window forward only
+    clears the buckets that fell out of it.
+    """
+
+    __slots__ = ('width', 'size', 'head', 'up', 'total', 'sum_up', 'sum_total')
+
+    def __init__(self, width, size):
+        self.width = width
+        self.size = size
+        self.head = None
+        self.up = [0] * size
+        self.total = [0] * size
+        self.sum_up = 0
+        self.sum_total = 0
+
+    def _advance(self, bucket):
+        if self.head is None:
+            self.head = bucket
+            return
+        if bucket <= self.head:
+            return
+        steps = min(bucket - self.head, self.size)
+        for b in range(bucket - steps + 1, bucket + 1):
+            i = b % self.size
+            self.sum_up -= self.up[i]
+            self.sum_total -= self.total[i]
+            self.up[i] = self.total[i] = 0
+        self.head = bucket
+
+    def _index(self, epoch):
+        bucket = int(epoch) // self.width
+        self._advance(bucket)
+        if bucket <= self.head - self.size:
+            return None, bucket
+        return bucket % self.size, bucket
+
+    def add(self, epoch, up):
+        i, bucket = self._index(epoch)
+        if i is None:
+            return None
+        self.total[i] += 1
+        self.sum_total += 1
+        if up:
+            self.up[i] += 1
+            self.sum_up += 1
+        return bucket
+
+    def load(self, bucket, up, total):
+        i, _ = self._index(bucket * self.width)
+        if i is None:
+            return
+        self.sum_up += up - self.up[i]
+        self.sum_total += total - self.total[i]
+        self.up[i] = up
+        self.total[i] = total
+
+    def counts(self, bucket):
+        if self.head is None or not self.head - self.size < bucket <= self.head:
+            return 0, 0
+        i = bucket % self.size
+        return self.up[i], self.total[i]
+
+    def percent(self, now=None):
+        if now is not None:
+            self._advance(int(now) // self.width)
+        if not self.sum_total:
+            return 100.0
+        return round(self.sum_up * 100.0 / self.sum_total, 2)
+
+
+class UptimeTracker:
+    """Rolling 24-hour and 30-day uptime for every monitor.
+
+    Not thread-safe; it is only touched from the write-behind flush thread.
+    """
+
+    def __init__(self):
+        self._windows = {}
+
+    def __contains__(self, monitor_id):
+        return monitor_id in self._windows
+
+    def windows(self, monitor_id):
+        windows = self._windows.get(monitor_id)
+        if windows is None:
+            windows = self._windows[monitor_id] = (UptimeWindow(*WINDOW_24H),
+                                                   UptimeWindow(*WINDOW_30D))
+        return windows
+
+    def load(self, monitor_id, width, bucket, up, total):
+        day, month = self.windows(monitor_id)
+        window = day if width == day.width else month
+        window.load(bucket, up, total)
+
+    def add(self, monitor_id, epoch, up):
+        """Record one check and return the ``(width, bucket)`` keys it touched."""
+        touched = []
+        for window in self.windows(monitor_id):
+            bucket = window.add(epoch, up)
+            if bucket is not None:
+                touched.append((window.width, bucket))
+        return touched
+
+    def counts(self, monitor_id, width, bucket):
+        for window in self.windows(monitor_id):
+            if window.width == width:
+                return window.counts(bucket)
+
+    def percentages(self, monitor_id, now=None):
+        day, month = self.windows(monitor_id)
+        return day.percent(now), month.percent(now)
+
+    def discard(self, monitor_id):
+        self._windows.pop(monitor_id, None)
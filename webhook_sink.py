@@ -0,0 +1,54 @@
+"""Local webhook endpoint for trying out notifications.
+
+    python webhook_sink.py [--port 8099] [--status 200]
+    NOTIFY_WEBHOOK_URLS=http://127.0.0.1:8099/ python app.py
+
+Prints every JSON body it receives as one line on stdout. ``--status``
+answers with another code, e.g. 503 to watch the retries.
+"""
+import argparse
+import json
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_handler(status, received):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                payload = body.decode('utf-8', 'replace')
+            received.append(payload)
+            print(json.dumps(payload), flush=True)
+            self.send_response(status)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, *args):
+            print(self.address_string(), args[0] % args[1:], file=sys.stderr)
+
+    return Handler
+
+
+def serve(port=0, status=200, host='127.0.0.1'):
+    """Return ``(server, received)``; call ``server.serve_forever()`` to run it."""
+    received = []
+    return ThreadingHTTPServer((host, port), make_handler(status, received)), received
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Print the webhook notifications it receives.')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--status', type=int, default=200, help='HTTP status to answer with')
+    args = parser.parse_args()
+    server, _ = serve(args.port, args.status)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
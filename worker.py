@@ -0,0 +1,40 @@
+"""Standalone checker worker.
+
+Run one or more of these next to the web app (with CHECKER_MODE=external).
+Workers register in the checker_lease table and split the monitors between
+them with a consistent hash ring, so every monitor is probed by exactly one
+worker and adding a worker only moves a share of the monitors.
+
+    python worker.py [--id NAME] [--metrics-port PORT]
+
+With ``--metrics-port`` the worker serves its checker metrics at
+``http://HOST:PORT/metrics`` for Prometheus.
+"""
+import argparse
+import signal
+import threading
+
+import metrics
+from app import app, checker_metrics, start_checker, stop_checker
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run uptime checks for a shard of monitors.')
+    parser.add_argument('--id', help='worker id (default: hostname:pid)')
+    parser.add_argument('--metrics-port', type=int, help='serve /metrics on this port')
+    args = parser.parse_args()
+
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+    signal.signal(signal.SIGINT, lambda *_: stopped.set())
+
+    if args.metrics_port:
+        metrics.serve(checker_metrics, args.metrics_port)
+    start_checker(args.id)
+    app.logger.info('Checker worker %s started', args.id or '')
+    stopped.wait()
+    stop_checker()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue:
+    """Buffers items and hands them to ``flush`` in batches on a background thread.
+
+    A batch is flushed once ``max_rows`` items are pending or ``max_delay_ms``
+    has passed since the first pending item, whichever comes first.
+    """
+
+    def __init__(self, flush, max_rows=500, max_delay_ms=1000):
+        self.flush = flush
+        self.max_rows = max_rows
+        self.max_delay = max_delay_ms / 1000
+        self._pending = []
+        self._first_at = None
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        if self._thread is None:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def put(self, item):
+        with self._cond:
+            if not self._pending:
+                self._first_at = time.monotonic()
+                self._cond.notify()
+            self._pending.append(item)
+            if len(self._pending) >= self.max_rows:
+                self._cond.notify()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _take(self):
+        with self._cond:
+            while not self._stopping:
+                if self._pending:
+                    remaining = self._first_at + self.max_delay - time.monotonic()
+                    if len(self._pending) >= self.max_rows or remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                else:
+                    self._cond.wait()
+            batch, self._pending = self._pending, []
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            for start in range(0, len(batch), self.max_rows):
+                try:
+                    self.flush(batch[start:start + self.max_rows])
+                except Exception:
+                    logger.exception('Write-behind flush of %d items failed',
+                                     len(batch[start:start + self.max_rows]))
+            if self._stopping and not self._pending:
+                return